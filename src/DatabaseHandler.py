@@ -1,19 +1,25 @@
 # General imports =================================================================================
 import json
+import math
 import multiprocessing as mp
 from pathlib import Path
+import queue
 import time
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from pocketbase import Client
 from pocketbase.errors import ClientResponseError
 from pocketbase.services.realtime_service import MessageData
-from collections import defaultdict
 import requests
 
+from DatabaseWriter import DatabaseWriter
 from LoadcellHandler import LoadCellHandler
+from TelemetrySpool import SpoolUploader, TelemetrySpool
 from br_threading.WorkQCommands import WorkQCmnd, WorkQCmnd_e
 from PlcHandler import PlcData
-from LabjackProcess import GET_SCANS_PER_READ, LjData
+from LabjackProcess import ChannelDecoder, LjData, LjDioPulse, LjRingInfo, decode_ring_frame, load_labjack_config
+from br_threading.SharedFrameRing import SharedFrameRing
+from br_util.ColumnBatch import ColumnBatch
+import numpy as np
 from dotenv import load_dotenv
 import os
 
@@ -21,6 +27,26 @@ PB_URL = 'http://192.168.8.68:8090' # Database Pi IP
 
 EXPECTED_SCHEMA_JSON = os.path.join(Path(__file__).parents[1], "DatabaseSchema.json")
 
+# Local spool of telemetry frames awaiting upload, capacity is in frames per collection
+SPOOL_DIR = os.path.join(Path(__file__).parents[1], "spool")
+SPOOL_CAPACITY = {"LabJack": 1_000_000, "Plc": 100_000}
+SPOOL_DEFAULT_CAPACITY = 100_000
+
+# LabJack batch writes, a record is created when either limit is reached
+LJ_BATCH_MAX_SAMPLES = 1000 # Samples per channel in one LabJack record
+LJ_BATCH_MAX_PERIOD_S = 1.0 # Maximum age of the oldest sample in a LabJack record
+
+# PLC batch writes, a record is created when either limit is reached
+PLC_BATCH_MAX_SAMPLES = 15 # PLC polls in one Plc record
+PLC_BATCH_MAX_PERIOD_S = 1.0 # Maximum age of the oldest poll in a Plc record
+
+# How long the database thread waits for a message before completing batches whose time window elapsed
+BATCH_FLUSH_POLL_S = 0.1
+
+# PLC reset, a LabJack digital output wired to the PLC reset input is pulsed
+PLC_RESET_LINE = "FIO0"
+PLC_RESET_PULSE_S = 3.0
+
 
 # Class Definitions ===============================================================================
 class DatabaseHandler():
@@ -41,12 +67,21 @@ class DatabaseHandler():
         DatabaseHandler.db_thread_workq = db_thread_workq
         DatabaseHandler.client = Client(PB_URL, timeout=5)
         DatabaseHandler.token = None
+        DatabaseHandler.lj_rings: Dict[str, Tuple[SharedFrameRing, ChannelDecoder, str]] = {}
+        DatabaseHandler.lj_batches: Dict[str, ColumnBatch] = {}
+        DatabaseHandler.plc_batch = ColumnBatch(PLC_BATCH_MAX_SAMPLES, PLC_BATCH_MAX_PERIOD_S)
+        DatabaseHandler.lj_ring_dropped: Dict[str, int] = {}
+        DatabaseHandler.spools: Dict[str, Tuple[TelemetrySpool, SpoolUploader]] = {}
 
         # Wait for the database to be available
         while not DatabaseHandler.verify_connection():
             print(f"DB - Failed to connect to the database @{PB_URL}, retrying in 5s...")
             time.sleep(5)
 
+        # Telemetry and state records are created off this thread so a slow
+        # response never holds up the commands flowing through the workq
+        DatabaseHandler.writer = DatabaseWriter(PB_URL)
+
         # Load environment variables from .env file
         load_dotenv()
 
@@ -60,6 +95,7 @@ class DatabaseHandler():
 
         auth_data = DatabaseHandler.client.collection("_superusers").auth_with_password(admin_email, admin_password)
         DatabaseHandler.token = auth_data.token
+        DatabaseHandler.writer.set_token(DatabaseHandler.token)
         if DatabaseHandler.token is None:
             print("DB - Failed to authenticate as admin.")
             return
@@ -72,8 +108,6 @@ class DatabaseHandler():
         DatabaseHandler.client.collection('StateCommand').subscribe(DatabaseHandler._handle_state_command_callback)
         DatabaseHandler.client.collection('HeartbeatMessage').subscribe(DatabaseHandler._handle_heartbeat_callback)
 
-        DatabaseHandler.lj_data_packet: Dict[str, List] = defaultdict(list)
-        DatabaseHandler.plc_data_packet: Dict[str, List] = defaultdict(list)
         print("DB - thread started")
 
     @staticmethod
@@ -269,6 +303,11 @@ class DatabaseHandler():
                     expected_collection_schema["updated"] = "autodate"
 
                     expected_schema[collection_name] = expected_collection_schema
+
+            # Every configured LabJack's channels are columns of the LabJack collection
+            for config in load_labjack_config():
+                for name in list(config.pt_map.values()) + list(config.lc_map.values()):
+                    expected_schema["LabJack"].setdefault(name, "json")
         except Exception as e:
             print(f"DB - Could not load expected schema: {e}")
             return False
@@ -347,6 +386,11 @@ class DatabaseHandler():
         """
         Attempt to write incoming plc data to the database.
 
+        Batch Write Feature:
+        Polls are accumulated with their timestamps and a record is
+        written once PLC_BATCH_MAX_SAMPLES polls are collected or the
+        oldest poll is PLC_BATCH_MAX_PERIOD_S old.
+
         Args:
             plc_data (Tuple[bytes]):
                 The plc data, with the first position
@@ -365,54 +409,56 @@ class DatabaseHandler():
         pt_data = plc_data.pt_data
         valve_data = plc_data.valve_data
 
-        DatabaseHandler.plc_data_packet["TC1"].append(tc_data[0]/100)
-        DatabaseHandler.plc_data_packet["TC2"].append(tc_data[1]/100)
-        DatabaseHandler.plc_data_packet["TC3"].append(tc_data[2]/100)
-        DatabaseHandler.plc_data_packet["TC4"].append(tc_data[3]/100)
-        DatabaseHandler.plc_data_packet["TC5"].append(tc_data[4]/100)
-        DatabaseHandler.plc_data_packet["TC6"].append(tc_data[5]/100)
-        DatabaseHandler.plc_data_packet["TC7"].append(tc_data[6]/100)
-        DatabaseHandler.plc_data_packet["TC8"].append(tc_data[7]/100)
-        DatabaseHandler.plc_data_packet["TC9"].append(tc_data[8]/100)
-
-        DatabaseHandler.plc_data_packet["LC1"].append(lc_handler.convert_raw_voltage("LC1", lc_data[0]))
-        DatabaseHandler.plc_data_packet["LC2"].append(lc_handler.convert_raw_voltage("LC2", lc_data[1]))
-        DatabaseHandler.plc_data_packet["LC7"].append(lc_handler.convert_raw_voltage("LC7", lc_data[2]))
-
-        DatabaseHandler.plc_data_packet["PT1"].append(pt_data[0])
-        DatabaseHandler.plc_data_packet["PT2"].append(pt_data[1])
-        DatabaseHandler.plc_data_packet["PT3"].append(pt_data[2])
-        DatabaseHandler.plc_data_packet["PT4"].append(pt_data[3])
-        DatabaseHandler.plc_data_packet["PT5"].append(pt_data[4])
-
-        DatabaseHandler.plc_data_packet["PBV1"].append(valve_data[0])
-        DatabaseHandler.plc_data_packet["PBV2"].append(valve_data[1])
-        DatabaseHandler.plc_data_packet["PBV3"].append(valve_data[2])
-        DatabaseHandler.plc_data_packet["PBV4"].append(valve_data[3])
-        DatabaseHandler.plc_data_packet["PBV5"].append(valve_data[4])
-        DatabaseHandler.plc_data_packet["PBV6"].append(valve_data[5])
-        DatabaseHandler.plc_data_packet["PBV7"].append(valve_data[6])
-        DatabaseHandler.plc_data_packet["PBV8"].append(valve_data[7])
-        DatabaseHandler.plc_data_packet["PBV9"].append(valve_data[8])
-        DatabaseHandler.plc_data_packet["PBV10"].append(valve_data[9])
-        DatabaseHandler.plc_data_packet["PBV11"].append(valve_data[10])
-
-        DatabaseHandler.plc_data_packet["SOL1"].append(valve_data[11])
-        DatabaseHandler.plc_data_packet["SOL2"].append(valve_data[12])
-        DatabaseHandler.plc_data_packet["SOL3"].append(valve_data[13])
-        DatabaseHandler.plc_data_packet["SOL4"].append(valve_data[14])
-        DatabaseHandler.plc_data_packet["SOL5"].append(valve_data[15])
-
-        DatabaseHandler.plc_data_packet["IGN1"].append(valve_data[16])
-        DatabaseHandler.plc_data_packet["IGN2"].append(valve_data[17])
-
-        if len(DatabaseHandler.plc_data_packet["TC1"]) == 1:
-            try:
-                DatabaseHandler.client.collection("Plc").create(DatabaseHandler.plc_data_packet)
-            except Exception as e:
-                print(f"failed to create a plc_data entry {e}")
-
-            DatabaseHandler.plc_data_packet.clear()
+        chunk = {}
+        chunk["timestamp"] = [plc_data.timestamp]
+
+        chunk["TC1"] = [tc_data[0]/100]
+        chunk["TC2"] = [tc_data[1]/100]
+        chunk["TC3"] = [tc_data[2]/100]
+        chunk["TC4"] = [tc_data[3]/100]
+        chunk["TC5"] = [tc_data[4]/100]
+        chunk["TC6"] = [tc_data[5]/100]
+        chunk["TC7"] = [tc_data[6]/100]
+        chunk["TC8"] = [tc_data[7]/100]
+        chunk["TC9"] = [tc_data[8]/100]
+
+        chunk["LC1"] = [lc_handler.convert_raw_voltage("LC1", lc_data[0])]
+        chunk["LC2"] = [lc_handler.convert_raw_voltage("LC2", lc_data[1])]
+        chunk["LC7"] = [lc_handler.convert_raw_voltage("LC7", lc_data[2])]
+
+        chunk["PT1"] = [pt_data[0]]
+        chunk["PT2"] = [pt_data[1]]
+        chunk["PT3"] = [pt_data[2]]
+        chunk["PT4"] = [pt_data[3]]
+        chunk["PT5"] = [pt_data[4]]
+
+        chunk["PBV1"] = [valve_data[0]]
+        chunk["PBV2"] = [valve_data[1]]
+        chunk["PBV3"] = [valve_data[2]]
+        chunk["PBV4"] = [valve_data[3]]
+        chunk["PBV5"] = [valve_data[4]]
+        chunk["PBV6"] = [valve_data[5]]
+        chunk["PBV7"] = [valve_data[6]]
+        chunk["PBV8"] = [valve_data[7]]
+        chunk["PBV9"] = [valve_data[8]]
+        chunk["PBV10"] = [valve_data[9]]
+        chunk["PBV11"] = [valve_data[10]]
+
+        chunk["SOL1"] = [valve_data[11]]
+        chunk["SOL2"] = [valve_data[12]]
+        chunk["SOL3"] = [valve_data[13]]
+        chunk["SOL4"] = [valve_data[14]]
+        chunk["SOL5"] = [valve_data[15]]
+
+        chunk["IGN1"] = [valve_data[16]]
+        chunk["IGN2"] = [valve_data[17]]
+
+        records = DatabaseHandler.plc_batch.extend(chunk)
+        record = DatabaseHandler.plc_batch.flush_if_due()
+        if record is not None:
+            records.append(record)
+
+        DatabaseHandler.spool_records("Plc", records)
 
     @staticmethod
     def write_lj_data(lj_data: LjData, lc_handler: LoadCellHandler) -> None:
@@ -420,40 +466,222 @@ class DatabaseHandler():
         Attempt to write incoming labjack data to the database.
 
         Batch Write Feature:
-        Based on LjData scan rate, the DB handler will
-        collect that many pieces of data and write to the DB once the
-        full package is complete, this allows for faster DB writes.
+        Whole columns are appended to a columnar batch, a record is
+        written once the batch holds LJ_BATCH_MAX_SAMPLES samples or
+        its oldest sample is LJ_BATCH_MAX_PERIOD_S old, this allows
+        for faster DB writes.
 
         Args:
-            lj_data (tuple): The labjack data, with the first position
-                containing the list of data
+            lj_data (LjData): The labjack data, with a column of samples per sensor
             lc_handler (LoadCellHandler):
                 The load cell handler to handle the load cell mass conversions.
         """
-        for i in range(GET_SCANS_PER_READ(lj_data.scan_rate)):
-            for key in lj_data.lc_data:
-                DatabaseHandler.lj_data_packet[key].append(
-                    lc_handler.convert_raw_voltage(key, lj_data.lc_data[key].pop(0))
-                )
-            for key in lj_data.pt_data:
-                DatabaseHandler.lj_data_packet[key].append(
-                    lj_data.pt_data[key].pop(0)
-                )
-
-            if lj_data.scan_rate <= 10:
-                try:
-                    DatabaseHandler.client.collection("LabJack").create(DatabaseHandler.lj_data_packet)
-                except Exception as e:
-                    print(f"failed to create a lj_data entry {e}")
-                DatabaseHandler.lj_data_packet.clear()
-                return
-
-            if len(DatabaseHandler.lj_data_packet[key]) == lj_data.scan_rate:
-                try:
-                    DatabaseHandler.client.collection("LabJack").create(DatabaseHandler.lj_data_packet)
-                except Exception as e:
-                    print(f"failed to create a lj_data entry {e}")
-                DatabaseHandler.lj_data_packet.clear()
+        chunk = {}
+        for key, values in lj_data.lc_data.items():
+            chunk[key] = lc_handler.convert_raw_voltages(key, np.asarray(values, dtype=np.float64))
+        for key, values in lj_data.pt_data.items():
+            chunk[key] = np.asarray(values, dtype=np.float64)
+
+        # Samples are evenly spaced at the scan rate from the stream's timebase,
+        # without one the last sample is taken to have been read just now
+        n_samples = len(next(iter(chunk.values())))
+        if lj_data.start_time is not None:
+            chunk["timestamp"] = lj_data.start_time + (lj_data.scan_index + np.arange(n_samples)) / lj_data.scan_rate
+        else:
+            chunk["timestamp"] = time.time() - np.arange(n_samples - 1, -1, -1) / lj_data.scan_rate
+
+        DatabaseHandler.batch_lj_chunk(lj_data.device, chunk)
+
+    @staticmethod
+    def batch_lj_chunk(device: str, chunk: Dict[str, np.ndarray]) -> None:
+        """
+        Append a chunk of LabJack columns to the device's batch and spool
+        the records it completes.
+
+        Every device has its own batch and spool since their columns differ,
+        all of them upload to the LabJack collection. Each record carries the
+        device name and the host timestamp of every sample, which merges the
+        devices into one feed.
+
+        Args:
+            device (str):
+                The name of the device the samples came from.
+            chunk (Dict[str, np.ndarray]):
+                Equal length columns with a timestamp column.
+        """
+        if device not in DatabaseHandler.lj_batches:
+            DatabaseHandler.lj_batches[device] = ColumnBatch(LJ_BATCH_MAX_SAMPLES, LJ_BATCH_MAX_PERIOD_S)
+        batch = DatabaseHandler.lj_batches[device]
+
+        records = batch.extend(chunk)
+        record = batch.flush_if_due()
+        if record is not None:
+            records.append(record)
+
+        DatabaseHandler.spool_records("LabJack", records, f"LabJack_{device}", {"device": device})
+
+    @staticmethod
+    def flush_due_batches(force: bool = False) -> None:
+        """
+        Spool every batch whose time window has elapsed, so a source that
+        stopped producing does not hold back its last samples.
+
+        Args:
+            force (bool):
+                Spool every partial batch whatever its age, for shutdown.
+        """
+        now = math.inf if force else time.monotonic() # Every window has elapsed at infinity
+        record = DatabaseHandler.plc_batch.flush_if_due(now)
+        if record is not None:
+            DatabaseHandler.spool_records("Plc", [record])
+
+        for device, batch in DatabaseHandler.lj_batches.items():
+            record = batch.flush_if_due(now)
+            if record is not None:
+                DatabaseHandler.spool_records("LabJack", [record], f"LabJack_{device}", {"device": device})
+
+    @staticmethod
+    def spool_records(collection: str, records: List[Dict[str, np.ndarray]], spool_name: Optional[str] = None,
+                      fields: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Write completed telemetry records to the collection's local spool
+        before upload. The spool's uploader creates them in the database,
+        replaying anything that could not be uploaded once the database recovers.
+
+        Args:
+            collection (str):
+                The name of the collection the records belong to.
+            records (List[Dict[str, np.ndarray]]):
+                The records, each with a timestamp column.
+            spool_name (Optional[str]):
+                The name of the spool, for sources with different columns
+                uploading to the same collection. Default is the collection name.
+            fields (Optional[Dict[str, Any]]):
+                Fields added to every record uploaded from the spool, e.g. the device name.
+        """
+        if spool_name is None:
+            spool_name = collection
+
+        for record in records:
+            columns = [name for name in record if name != "timestamp"]
+            if spool_name not in DatabaseHandler.spools or DatabaseHandler.spools[spool_name][0].columns != columns:
+                DatabaseHandler.open_spool(collection, columns, spool_name, fields)
+
+            spool, uploader = DatabaseHandler.spools[spool_name]
+            spool.append(record)
+            uploader.notify()
+
+    @staticmethod
+    def open_spool(collection: str, columns: List[str], spool_name: Optional[str] = None,
+                   fields: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Open a local spool for a collection and start its uploader,
+        replacing the spool already open under the same name.
+
+        Args:
+            collection (str):
+                The name of the collection.
+            columns (List[str]):
+                The value columns of the records.
+            spool_name (Optional[str]):
+                The name of the spool. Default is the collection name.
+            fields (Optional[Dict[str, Any]]):
+                Fields added to every record uploaded from the spool.
+        """
+        if spool_name is None:
+            spool_name = collection
+
+        DatabaseHandler.close_spool(spool_name)
+
+        spool = TelemetrySpool(
+            os.path.join(SPOOL_DIR, f"{spool_name}.spool"),
+            columns,
+            SPOOL_CAPACITY.get(collection, SPOOL_DEFAULT_CAPACITY)
+        )
+        uploader = SpoolUploader(spool, DatabaseHandler.writer, collection, fields)
+        DatabaseHandler.spools[spool_name] = (spool, uploader)
+
+    @staticmethod
+    def close_spool(spool_name: str) -> None:
+        """
+        Stop a spool's uploader, which closes the spool once its in-flight
+        upload is done. Frames not uploaded yet stay in the spool file.
+
+        Args:
+            spool_name (str): The name of the spool.
+        """
+        if spool_name not in DatabaseHandler.spools:
+            return
+
+        _, uploader = DatabaseHandler.spools.pop(spool_name)
+        uploader.stop()
+
+    @staticmethod
+    def attach_lj_ring(ring_info: LjRingInfo) -> bool:
+        """
+        Attach to a shared memory ring created by the LabJack process.
+
+        Args:
+            ring_info (LjRingInfo):
+                The name of the ring and the layout of the stream data in each frame.
+
+        Returns:
+            bool: True if the ring was attached, the LabJack process can then
+            release the ring it replaces.
+        """
+        # The producer stopped writing the replaced ring before sending this,
+        # and its last frames were already read through earlier LJ_RING_DATA
+        for name in (ring_info.ring_name, ring_info.replaces):
+            if name in DatabaseHandler.lj_rings:
+                DatabaseHandler.lj_rings.pop(name)[0].close()
+                DatabaseHandler.lj_ring_dropped.pop(name, None)
+
+        try:
+            ring = SharedFrameRing.attach(ring_info.ring_name)
+        except FileNotFoundError:
+            print(f"DB - LabJack ring {ring_info.ring_name} does not exist")
+            return False
+
+        decoder = ChannelDecoder(ring_info.scan_list, ring_info.pt_map, ring_info.lc_map)
+        DatabaseHandler.lj_rings[ring_info.ring_name] = (ring, decoder, ring_info.device)
+        DatabaseHandler.lj_ring_dropped[ring_info.ring_name] = ring.dropped
+        return True
+
+    @staticmethod
+    def read_lj_ring(ring_name: str) -> List[LjData]:
+        """
+        Drain every pending frame from a LabJack shared memory ring.
+
+        Args:
+            ring_name (str):
+                The name of the ring with new frames.
+
+        Returns:
+            List[LjData]: The decoded stream reads, oldest first.
+        """
+        if ring_name not in DatabaseHandler.lj_rings:
+            return []
+
+        ring, decoder, device = DatabaseHandler.lj_rings[ring_name]
+
+        lj_data = [decode_ring_frame(decoder, tags, frame, device) for _, tags, frame in ring.read_all()]
+
+        dropped = ring.dropped
+        if dropped != DatabaseHandler.lj_ring_dropped[ring_name]:
+            print(f"DB - {device} LabJack ring full, {dropped - DatabaseHandler.lj_ring_dropped[ring_name]} stream reads dropped")
+            DatabaseHandler.lj_ring_dropped[ring_name] = dropped
+
+        return lj_data
+
+    @staticmethod
+    def write_lj_stream_stats(stats: Dict[str, object]) -> None:
+        """
+        Write the LabJack stream counters for one period to the database.
+
+        Args:
+            stats (Dict[str, object]): The stream counters record.
+        """
+        DatabaseHandler.writer.submit("LabJackStreamStats", stats)
 
     @staticmethod
     def write_system_state(state_payload: Dict[str, str]) -> None:
@@ -467,10 +695,7 @@ class DatabaseHandler():
         entry["system_state"] = state_payload["current_state"]
         entry["hardware_abort"] = state_payload["hardware_abort"]
 
-        try:
-            DatabaseHandler.client.collection("SystemState").create(entry)
-        except Exception:
-            print(f"failed to create a system state")
+        DatabaseHandler.writer.submit("SystemState", entry)
 
     @staticmethod
     def write_heartbeat(data: str) -> None:
@@ -483,10 +708,7 @@ class DatabaseHandler():
         entry = {}
         entry["message"] = data
 
-        try:
-            DatabaseHandler.client.collection("HeartbeatMessage").create(entry)
-        except Exception:
-            print(f"failed to create a heartbeat")
+        DatabaseHandler.writer.submit("HeartbeatMessage", entry)
 
 
 
@@ -511,17 +733,16 @@ def process_workq_message(message: WorkQCmnd, state_workq: mp.Queue, hb_workq: m
     """
     if message.command == WorkQCmnd_e.KILL_PROCESS:
         print("DB - Received kill command")
+        # The last partial batches, with any abort data, are spooled before the spools close
+        DatabaseHandler.flush_due_batches(force=True)
+        for spool_name in list(DatabaseHandler.spools):
+            DatabaseHandler.close_spool(spool_name)
+        DatabaseHandler.writer.close()
         return False
     elif message.command == WorkQCmnd_e.DB_GS_COMMAND:
         if message.data == "PLC_RESET":
-            lj_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_FIO0_TOGGLE, None))
-
-            # Start a non-blocking timer to send the command again in 3 seconds
-            def send_command_again():
-                lj_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_FIO0_TOGGLE, None))
-
-            timer = mp.Process(target=lambda: (time.sleep(3), send_command_again()))
-            timer.start()
+            # The LabJack process times the end of the pulse itself
+            lj_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_DIO_PULSE, LjDioPulse(PLC_RESET_LINE, PLC_RESET_PULSE_S)))
         else:
             state_workq.put(WorkQCmnd(WorkQCmnd_e.STATE_HANDLE_VALVE_COMMAND, message.data))
     elif message.command == WorkQCmnd_e.DB_STATE_COMMAND:
@@ -536,8 +757,16 @@ def process_workq_message(message: WorkQCmnd, state_workq: mp.Queue, hb_workq: m
         DatabaseHandler.write_plc_data(message.data, lc_handler)
     elif message.command == WorkQCmnd_e.LJ_DATA:
         DatabaseHandler.write_lj_data(message.data, lc_handler)
+    elif message.command == WorkQCmnd_e.LJ_RING_ATTACH:
+        if DatabaseHandler.attach_lj_ring(message.data):
+            lj_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_RING_ATTACHED, message.data.ring_name))
+    elif message.command == WorkQCmnd_e.LJ_RING_DATA:
+        for lj_data in DatabaseHandler.read_lj_ring(message.data):
+            DatabaseHandler.write_lj_data(lj_data, lc_handler)
+    elif message.command == WorkQCmnd_e.DB_LJ_STREAM_STATS:
+        DatabaseHandler.write_lj_stream_stats(message.data)
     elif message.command == WorkQCmnd_e.LC_REFERENCE_VOLTAGE:
-        lc_handler.apply_reference_voltage(message.data)
+        lc_handler.apply_reference_voltage(message.data.voltage, message.data.device, message.data.load_cells)
     return True
 
 def database_thread(db_workq: mp.Queue, state_workq: mp.Queue, hb_workq: mp.Queue, lj_workq: mp.Queue, data_base_format_file: str = EXPECTED_SCHEMA_JSON) -> None:
@@ -551,5 +780,11 @@ def database_thread(db_workq: mp.Queue, state_workq: mp.Queue, hb_workq: mp.Queu
 
     while 1:
         # If there is any workq messages, process them
-        if not process_workq_message(db_workq.get(block=True), state_workq, hb_workq, lj_workq, lc_handler):
+        try:
+            message = db_workq.get(block=True, timeout=BATCH_FLUSH_POLL_S)
+        except queue.Empty:
+            DatabaseHandler.flush_due_batches()
+            continue
+
+        if not process_workq_message(message, state_workq, hb_workq, lj_workq, lc_handler):
             return
@@ -0,0 +1,140 @@
+# General imports =================================================================================
+import asyncio
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+import threading
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+# Constants ========================================================================================
+MAX_IN_FLIGHT_PER_COLLECTION = 2 # Concurrent create requests per collection
+MAX_CONNECTIONS = 8 # Connections in the keep-alive pool shared by all collections
+MAX_PENDING_PER_COLLECTION = 500 # Records queued per collection before the oldest are dropped
+REQUEST_TIMEOUT_S = 5
+
+# Class Definitions ===============================================================================
+@dataclass
+class _PendingRecord():
+    record: Dict[str, Any]
+    future: Future
+
+class DatabaseWriter():
+    def __init__(self, base_url: str, token: Optional[str] = None):
+        """
+        Non-blocking PocketBase record writer.
+
+        Records are handed over with submit() and created by an asyncio
+        loop running on its own thread, over a keep-alive connection pool.
+        Each collection has at most MAX_IN_FLIGHT_PER_COLLECTION create
+        requests in flight, records that queue up behind them are sent
+        in order as requests complete. Telemetry is batched upstream,
+        by the spool uploaders, so every record is created as submitted.
+
+        Args:
+            base_url (str):
+                The PocketBase URL.
+            token (Optional[str]):
+                The auth token to send with every request.
+        """
+        self.base_url = base_url
+        self.token = token
+
+        self.pending: Dict[str, Deque[_PendingRecord]] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.loop_thread.start()
+
+    def submit(self, collection: str, record: Dict[str, Any]) -> Future:
+        """
+        Queue a record to be created in a collection, safe to call from any thread.
+
+        Args:
+            collection (str):
+                The name of the collection.
+            record (Dict[str, Any]):
+                The record to create.
+
+        Returns:
+            Future: Resolves to True once the record has been created, or raises the request error.
+        """
+        future = Future()
+        self.loop.call_soon_threadsafe(self._enqueue, collection, record, future)
+        return future
+
+    def set_token(self, token: Optional[str]) -> None:
+        """
+        Set the auth token sent with every request.
+
+        Args:
+            token (Optional[str]): The auth token.
+        """
+        self.loop.call_soon_threadsafe(self._apply_token, token)
+
+    def close(self) -> None:
+        """
+        Stop the writer, records that are still pending are discarded.
+        """
+        if self.client is not None:
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result(timeout=REQUEST_TIMEOUT_S)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(timeout=REQUEST_TIMEOUT_S)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=REQUEST_TIMEOUT_S,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        )
+        self._apply_token(self.token)
+        self.loop.run_forever()
+
+    def _apply_token(self, token: Optional[str]) -> None:
+        self.token = token
+        if self.client is None:
+            return
+        if token:
+            self.client.headers["Authorization"] = f"Bearer {token}"
+        else:
+            self.client.headers.pop("Authorization", None)
+
+    def _enqueue(self, collection: str, record: Dict[str, Any], future: Future) -> None:
+        """
+        Add a record to the collection's pending queue and start a sender if one is free.
+        Runs on the writer loop.
+        """
+        pending = self.pending.setdefault(collection, deque())
+        if len(pending) >= MAX_PENDING_PER_COLLECTION:
+            dropped = pending.popleft()
+            dropped.future.set_exception(RuntimeError(f"{collection} write queue full, record dropped"))
+            print(f"DB - {collection} write queue full, dropping oldest record")
+
+        pending.append(_PendingRecord(record, future))
+
+        if self.in_flight.get(collection, 0) < MAX_IN_FLIGHT_PER_COLLECTION:
+            self.in_flight[collection] = self.in_flight.get(collection, 0) + 1
+            self.loop.create_task(self._send_pending(collection))
+
+    async def _send_pending(self, collection: str) -> None:
+        """
+        Create pending records for a collection until its queue is empty.
+        """
+        try:
+            while self.pending[collection]:
+                pending = self.pending[collection].popleft()
+                try:
+                    response = await self.client.post(f"/api/collections/{collection}/records", json=pending.record)
+                    response.raise_for_status()
+                except Exception as e:
+                    print(f"DB - failed to create a {collection} record: {e}")
+                    pending.future.set_exception(e)
+                    continue
+
+                pending.future.set_result(True)
+        finally:
+            self.in_flight[collection] -= 1
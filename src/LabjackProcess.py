@@ -1,19 +1,91 @@
-from collections import defaultdict
-from dataclasses import dataclass
+import bisect
+from collections import deque
+from dataclasses import dataclass, field
 from enum import Enum
+import json
+import math
+import os
+from pathlib import Path
+import queue
 import time
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from br_threading.SharedFrameRing import SharedFrameRing
 from br_threading.WorkQCommands import WorkQCmnd, WorkQCmnd_e
+from br_util.PeriodicDeadline import PeriodicDeadline
+from br_util.TimerQueue import TimerQueue
 import multiprocessing as mp
-from br_labjack.LabJackInterface import DigitalOutput, LabJack
+from br_labjack.LabJackInterface import (
+    AnalogInput, DigitalPort, LabJack, MAX_SAMPLES_PER_PACKET_ETH, MAX_SAMPLES_PER_PACKET_USB, RegisterBatch,
+    STREAM_MAX_SAMPLE_RATE, STREAM_TRIGGER_EDGES
+)
 from labjack.ljm import LJMError
+from StateTruth import SystemStates
 
-CMD_RESPONSE_RATE_HZ = 5
-CMD_RESPONSE_PERIOD = 1.0 / CMD_RESPONSE_RATE_HZ
+CMD_RESPONSE_RATE_HZ = 10 # Slow logging rate in Hz for states without an entry in STATE_CMD_RESPONSE_RATE_HZ
 
-STREAM_RATE_HZ = 1000 # Scan rate in Hz
+# Slow logging rate in Hz requested for each state that polls
+STATE_CMD_RESPONSE_RATE_HZ = {
+    SystemStates.TEST: 10,
+    SystemStates.ABORT: 20,
+}
+
+STREAM_RATE_HZ = 1000 # Scan rate in Hz for states without an entry in STATE_STREAM_RATE_HZ
 DEFAULT_A_LIST_NAMES = ["AIN1", "AIN2", "AIN3", "AIN4", "AIN5", "AIN6", "AIN7", "AIN8", "AIN9", "AIN10", "AIN11", "AIN12", "AIN13"]
-GET_SCANS_PER_READ = lambda x: int(x/2) if int(x/2) != 0 else 1
+
+# Scan rate in Hz requested for each state that streams
+STATE_STREAM_RATE_HZ = {
+    SystemStates.FILL: 1000,
+    SystemStates.IGNITION: 2000,
+    SystemStates.FIRE: 5000,
+    SystemStates.POST_FIRE: 1000,
+}
+# Preferred stream resolution index, lowered for rates the device cannot sample at this resolution
+STREAM_RESOLUTION_INDEX = 4
+STREAM_TARGET_READ_PERIOD_S = 0.1 # Time between stream callbacks the scans per read aim for
+STREAM_MAX_SAMPLES_PER_READ = 16384 # Upper bound on the samples returned by one eStreamRead
+
+# Stream settings per connection type, reads are whole packets of the connection.
+# Ethernet carries up to 512 samples per packet against 24 over USB, and gets
+# the largest device buffer (a power of 2, 0 keeps the device default) to ride
+# out network jitter.
+STREAM_PACKET_SAMPLES = {"USB": MAX_SAMPLES_PER_PACKET_USB, "ETHERNET": MAX_SAMPLES_PER_PACKET_ETH, "WIFI": MAX_SAMPLES_PER_PACKET_ETH}
+STREAM_BUFFER_SIZE_BYTES = {"USB": 0, "ETHERNET": 32768, "WIFI": 0}
+
+LJ_RING_BUFFER_S = 4.0 # Seconds of stream reads the shared memory ring can hold before dropping
+LJ_RING_MIN_CAPACITY = 8
+
+# Tags stored in the ring with each stream read
+RING_TAG_START_TIME_US = 0 # Host time of the stream's first scan, in microseconds since the epoch
+RING_TAG_SCAN_RATE_MHZ = 1 # Actual scan rate in millihertz
+RING_TAG_SCAN_INDEX = 2 # Index of the read's first scan since the stream started
+RING_TAG_DEVICE_BACKLOG = 3 # deviceScanBacklog reported by eStreamRead
+RING_TAG_LJM_BACKLOG = 4 # ljmScanBacklog reported by eStreamRead
+LJ_RING_TAG_COUNT = 5
+
+STREAM_RETRY_PERIOD_S = 1.0 # Time between attempts to start a stream that failed to start
+STREAM_STATS_PERIOD_S = 5.0 # How often the stream counters are logged and published
+STREAM_SKIPPED_SAMPLE = -9999.0 # Value LJM puts in place of samples lost to a device buffer overflow
+CALLBACK_HIST_EDGES_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100] # Upper bucket edges, the last bucket is open
+
+# Devices to stream from, see load_labjack_config
+LJ_CONFIG_JSON = os.path.join(Path(__file__).parents[1], "LabJackConfig.json")
+DEFAULT_DEVICE_NAME = "T7_MAIN"
+
+# Reconnect supervisor, a device is reopened with exponential backoff after a fault
+LJ_RECONNECT_MIN_S = 0.1
+LJ_RECONNECT_MAX_S = 5.0
+LJ_SUPERVISOR_PERIOD_S = 0.05 # How often device faults are checked
+LJ_FAULT_READ_ERRORS = 3 # Consecutive failed command/response reads that count as a fault
+LJ_STREAM_STALL_READS = 5 # Read periods without a stream callback that count as a fault
+LJ_STREAM_STALL_MIN_S = 1.0
+
+# Burst capture, the last seconds of stream data are kept in memory and written
+# to a local file around an abort, at the full stream rate
+BURST_DIR = os.path.join(Path(__file__).parents[1], "bursts")
+BURST_PRE_S = 5.0 # Seconds kept before the trigger
+BURST_POST_S = 1.0 # Seconds captured after the trigger
+BURST_HOLD_MARGIN_S = 0.5 # Extra time a slow logging switch waits for the post-trigger window
 
 REFERENCE_VOLTAGE_NAME = ["AIN0",]  # The reference voltage for the load cell, which is AIN0
 
@@ -35,11 +107,418 @@ class LJ_SCAN_MODE(Enum):
 @dataclass
 class LjData():
     scan_rate: int
-    lc_data: Dict[str, list]
-    pt_data: Dict[str, list]
+    lc_data: Dict[str, Any]
+    pt_data: Dict[str, Any]
+    start_time: Optional[float] = None # Host time of scan 0, samples are at start_time + (scan_index + i) / scan_rate
+    scan_index: int = 0
+    device: str = DEFAULT_DEVICE_NAME
+
+@dataclass
+class LjRingInfo():
+    ring_name: str
+    scan_rate: int
+    scan_list: List[str]
+    pt_map: Dict[str, str] = field(default_factory=lambda: dict(PT_MAP))
+    lc_map: Dict[str, str] = field(default_factory=lambda: dict(LC_MAP))
+    replaces: Optional[str] = None # Name of a ring this one takes over from, it will not be written again
+    device: str = DEFAULT_DEVICE_NAME
+
+@dataclass
+class LjReferenceVoltage():
+    device: str
+    voltage: float # Load cell excitation measured on REFERENCE_VOLTAGE_NAME
+    load_cells: Optional[List[str]] # Load cells read by the device, None for every load cell no other device reads
+
+@dataclass
+class LjDioPulse():
+    line: str # DIO channel name on the first device, e.g. "FIO0"
+    duration_s: float # The line is inverted for this long, then restored
+
+@dataclass
+class LjDeviceConfig():
+    name: str
+    scan_list: List[str] = field(default_factory=lambda: list(DEFAULT_A_LIST_NAMES))
+    pt_map: Dict[str, str] = field(default_factory=lambda: dict(PT_MAP))
+    lc_map: Dict[str, str] = field(default_factory=lambda: dict(LC_MAP))
+    device_type: str = "T7"
+    connection: str = "USB"
+    identifier: str = "ANY" # Serial number or IP address, "ANY" opens the first device found
+    # AIN channel name, or "default" for every channel in the scan list, to its settings,
+    # any of "voltage_range", "resolution_index", "mode" and "negative_channel", see AnalogInput.config_registers
+    ain_config: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Streams in the trigger states wait for an edge on this line (FIO0 to FIO7) before the first scan,
+    # nothing is logged from the device between entering the state and the edge
+    stream_trigger_line: Optional[str] = None
+    stream_trigger_edge: str = "RISING" # "RISING", "FALLING" or "BOTH"
+    stream_trigger_states: List[str] = field(default_factory=lambda: ["FIRE"]) # SystemStates names
+    # Frequency of an external scan clock on CIO3, the scan rate becomes a divisor of it
+    external_clock_hz: Optional[float] = None
+    # Burst capture window around an abort, 0 pre-trigger seconds disables it
+    burst_pre_s: float = BURST_PRE_S
+    burst_post_s: float = BURST_POST_S
+
+class ChannelDecoder():
+    def __init__(self, scan_list: List[str], pt_map: Dict[str, str] = PT_MAP, lc_map: Dict[str, str] = LC_MAP):
+        """
+        Demultiplexes flat stream buffers into per-sensor columns.
+
+        The column indices of every mapped channel are worked out once
+        here, decoding a buffer is then a reshape to (scans, channels)
+        and one fancy index per sensor group, whatever the channel count.
+        Channels in the scan list that are in neither map are ignored.
+
+        Args:
+            scan_list (List[str]):
+                The list of AIN channels in the order they are streamed.
+            pt_map (Dict[str, str]):
+                AIN channel name to pressure transducer name.
+            lc_map (Dict[str, str]):
+                AIN channel name to load cell name.
+        """
+        self.scan_list = list(scan_list)
+        self.n_channels = len(self.scan_list)
+
+        self.pt_names = [pt_map[name] for name in self.scan_list if name in pt_map]
+        self.pt_index = np.array([i for i, name in enumerate(self.scan_list) if name in pt_map], dtype=np.intp)
+        self.lc_names = [lc_map[name] for name in self.scan_list if name in lc_map]
+        self.lc_index = np.array([i for i, name in enumerate(self.scan_list) if name in lc_map], dtype=np.intp)
+
+    def decode(self, stream_data) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Demultiplex a flat buffer into per-sensor columns.
+
+        The buffer is interleaved by scan ([AIN1, AIN2, ..., AIN1, AIN2, ...]),
+        a single command/response read is simply a buffer of one scan.
+
+        Args:
+            stream_data (array like):
+                The flat data buffer returned by eStreamRead or eReadNames.
+
+        Returns:
+            lc_data (Dict[str, np.ndarray]): The load cell columns keyed by sensor name.
+            pt_data (Dict[str, np.ndarray]): The pressure transducer columns keyed by sensor name.
+        """
+        scans = np.asarray(stream_data, dtype=np.float64).reshape(-1, self.n_channels)
+
+        # One gather per group, each row of the transposed block is a sensor column
+        lc_data = dict(zip(self.lc_names, scans[:, self.lc_index].T))
+        pt_data = dict(zip(self.pt_names, scans[:, self.pt_index].T))
+
+        return lc_data, pt_data
+
+@dataclass
+class StreamConfig():
+    scan_rate: int
+    scans_per_read: int
+    buffer_size_bytes: int = 0 # STREAM_BUFFER_SIZE_BYTES, 0 for the device default
+    clock_divisor: int = 0 # STREAM_EXTERNAL_CLOCK_DIVISOR of the external clock, 0 for the internal clock
+    trigger_line: Optional[str] = None # DIO line the stream waits for, None to start at once
+    trigger_edge: str = "RISING"
+    resolution_index: int = STREAM_RESOLUTION_INDEX
+
+    @property
+    def triggered(self) -> bool:
+        return self.trigger_line is not None
+
+    @property
+    def read_period_s(self) -> float:
+        return self.scans_per_read / self.scan_rate
+
+    @staticmethod
+    def for_rate(
+            scan_rate: int,
+            n_channels: int,
+            connection_type: str,
+            target_read_period_s: float = STREAM_TARGET_READ_PERIOD_S,
+            external_clock_hz: Optional[float] = None,
+            resolution_index: int = STREAM_RESOLUTION_INDEX,
+            device_type: str = "T7"
+        ) -> "StreamConfig":
+        """
+        Pick the scans per read for a scan rate so the callback runs about
+        every target_read_period_s. The count is rounded up to whole
+        packets of the connection, so each read returns full packets,
+        and the device buffer is sized for the connection.
+
+        With an external clock the scan rate is the clock divided by the
+        nearest whole divisor of the requested rate.
+
+        The resolution index is lowered until the device can sample every
+        channel at the scan rate, which is logged as information. If even the
+        fastest resolution cannot, the scan rate is clamped to what it can and
+        a stream rate error is logged.
+
+        Args:
+            scan_rate (int):
+                The scan rate in Hz.
+            n_channels (int):
+                The number of channels in the scan list.
+            connection_type (str):
+                The connection type, "USB", "ETHERNET" or "WIFI".
+            target_read_period_s (float):
+                The targeted time between stream callbacks.
+            external_clock_hz (Optional[float]):
+                The frequency of the external scan clock, None for the internal clock.
+            resolution_index (int):
+                The preferred stream resolution index.
+            device_type (str):
+                The device type, e.g. "T7", selects the sample rate limits.
+
+        Returns:
+            StreamConfig: The stream configuration.
+        """
+        clock_divisor = 0
+        if external_clock_hz is not None:
+            clock_divisor = max(1, round(external_clock_hz / scan_rate))
+            scan_rate = external_clock_hz / clock_divisor
+
+        max_sample_rates = STREAM_MAX_SAMPLE_RATE.get(device_type, {})
+        preferred_index = resolution_index
+        while resolution_index > 1 and scan_rate * n_channels > max_sample_rates.get(resolution_index, math.inf):
+            resolution_index -= 1
+
+        max_scan_rate = max_sample_rates.get(resolution_index, math.inf) / n_channels
+        if scan_rate > max_scan_rate:
+            requested_rate = scan_rate
+            if external_clock_hz is not None:
+                clock_divisor = math.ceil(external_clock_hz / max_scan_rate)
+                scan_rate = external_clock_hz / clock_divisor
+            else:
+                scan_rate = math.floor(max_scan_rate)
+            print(
+                f"LJ - Stream rate error: {requested_rate:.0f} Hz x {n_channels} channels is over the {device_type} limit "
+                f"at resolution index {resolution_index}, clamped to {scan_rate:.0f} Hz"
+            )
+        elif resolution_index != preferred_index:
+            print(
+                f"LJ - Stream resolution index {resolution_index} for {scan_rate:.0f} Hz x {n_channels} channels, "
+                f"index {preferred_index} is over the {device_type} limit"
+            )
+
+        packet_samples = STREAM_PACKET_SAMPLES.get(connection_type, MAX_SAMPLES_PER_PACKET_USB)
+        packet_scans = max(1, packet_samples // n_channels)
+        max_scans = max(packet_scans, STREAM_MAX_SAMPLES_PER_READ // n_channels)
+
+        scans_per_read = max(1, round(scan_rate * target_read_period_s))
+        scans_per_read = math.ceil(scans_per_read / packet_scans) * packet_scans
+
+        return StreamConfig(
+            scan_rate,
+            min(scans_per_read, max_scans),
+            STREAM_BUFFER_SIZE_BYTES.get(connection_type, 0),
+            clock_divisor,
+            resolution_index=resolution_index
+        )
+
+    @staticmethod
+    def for_state(
+            state: Optional[SystemStates],
+            n_channels: int,
+            connection_type: str,
+            state_rates: Dict[SystemStates, int] = STATE_STREAM_RATE_HZ,
+            default_rate: int = STREAM_RATE_HZ,
+            external_clock_hz: Optional[float] = None,
+            device_type: str = "T7"
+        ) -> "StreamConfig":
+        """
+        Args:
+            state (Optional[SystemStates]):
+                The state to stream for, None for the default rate.
+            n_channels (int):
+                The number of channels in the scan list.
+            connection_type (str):
+                The connection type, "USB", "ETHERNET" or "WIFI".
+            state_rates (Dict[SystemStates, int]):
+                The scan rate in Hz for each state.
+            default_rate (int):
+                The scan rate in Hz for states without an entry in state_rates.
+            external_clock_hz (Optional[float]):
+                The frequency of the external scan clock, None for the internal clock.
+            device_type (str):
+                The device type, e.g. "T7", selects the sample rate limits.
+
+        Returns:
+            StreamConfig: The stream configuration for the state.
+        """
+        return StreamConfig.for_rate(
+            state_rates.get(state, default_rate), n_channels, connection_type,
+            external_clock_hz=external_clock_hz, device_type=device_type
+        )
+
+class BurstRecorder():
+    def __init__(self, device: str, scan_list: List[str], pre_s: float = BURST_PRE_S, post_s: float = BURST_POST_S):
+        """
+        Keeps the last pre_s seconds of stream reads in memory and, once
+        triggered, post_s seconds more, then freezes until dumped.
+
+        Reads are kept as the arrays the stream callback already made,
+        so appending costs no copy whatever the rate, and a stream restart
+        at another rate inside the window is kept with its own timebase.
+        Only the stream callback appends, the LabJack loop triggers and
+        dumps once the recorder is complete or its stream stopped.
+
+        Args:
+            device (str):
+                The name of the device in the LabJack configuration.
+            scan_list (List[str]):
+                The list of AIN channels in the order they are streamed.
+            pre_s (float):
+                The seconds of data kept before the trigger.
+            post_s (float):
+                The seconds of data captured after the trigger.
+        """
+        self.device = device
+        self.scan_list = list(scan_list)
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.reset()
+
+    def reset(self) -> None:
+        self.chunks = deque() # (host time of the first scan, scan rate, scans x channels array)
+        self.trigger_time: Optional[float] = None
+        self.trigger_reason = ""
+        self.complete = False
+
+    @property
+    def triggered(self) -> bool:
+        return self.trigger_time is not None
+
+    def append(self, start_time: float, scan_rate: float, scans: np.ndarray) -> None:
+        """
+        Add a stream read, dropping the reads older than the pre-trigger window.
+
+        Args:
+            start_time (float): The host time of the first scan in the read.
+            scan_rate (float): The scan rate of the stream in Hz.
+            scans (np.ndarray): The read as a scans x channels array.
+        """
+        if self.complete:
+            return
+
+        self.chunks.append((start_time, scan_rate, scans))
+        end_time = start_time + len(scans) / scan_rate
+        if self.trigger_time is None:
+            while self.chunks and self.chunks[0][0] + len(self.chunks[0][2]) / self.chunks[0][1] < end_time - self.pre_s:
+                self.chunks.popleft()
+        elif end_time >= self.trigger_time + self.post_s:
+            self.complete = True
+
+    def trigger(self, reason: str, trigger_time: Optional[float] = None) -> bool:
+        """
+        Start the post-trigger window, unless it already started.
+
+        Args:
+            reason (str): What triggered the capture, stored in the file.
+            trigger_time (Optional[float]): The host time of the trigger, now if not given.
+
+        Returns:
+            bool: True if this call triggered the recorder.
+        """
+        if self.trigger_time is not None:
+            return False
+        self.trigger_reason = reason
+        self.trigger_time = time.time() if trigger_time is None else trigger_time
+        return True
+
+    def dump(self, directory: str = BURST_DIR) -> Optional[str]:
+        """
+        Write the capture window to a .npz file and start recording again.
+        Only call once complete or after the stream stopped.
+
+        The file holds "timestamps" (host seconds per scan), "data"
+        (scans x channels volts, -9999 for samples skipped by the device),
+        "channels", "trigger_time" and "reason".
+
+        Args:
+            directory (str): The directory to write the file in.
+
+        Returns:
+            Optional[str]: The path of the file, None if there was no data in the window.
+        """
+        window_start = self.trigger_time - self.pre_s
+        window_end = self.trigger_time + self.post_s
+        timestamps = []
+        data = []
+        for start_time, scan_rate, scans in self.chunks:
+            chunk_times = start_time + np.arange(len(scans)) / scan_rate
+            keep = (chunk_times >= window_start) & (chunk_times <= window_end)
+            timestamps.append(chunk_times[keep])
+            data.append(scans[keep])
+
+        path = None
+        n_scans = sum(len(chunk_times) for chunk_times in timestamps)
+        if n_scans > 0:
+            os.makedirs(directory, exist_ok=True)
+            stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.trigger_time))
+            path = os.path.join(directory, f"{self.device}_{stamp}_{self.trigger_reason}.npz")
+            np.savez(
+                path,
+                timestamps=np.concatenate(timestamps),
+                data=np.concatenate(data),
+                channels=np.array(self.scan_list),
+                trigger_time=self.trigger_time,
+                reason=self.trigger_reason,
+            )
+
+        self.reset()
+        return path
+
+class StreamStats():
+    def __init__(self):
+        """
+        Counters for one publishing period of a LabJack stream,
+        updated from the stream callback.
+        """
+        self.period_start = time.monotonic()
+        self.reads = 0
+        self.scans = 0
+        self.skipped_samples = 0
+        self.device_backlog_max = 0
+        self.ljm_backlog_max = 0
+        self.callback_ms_max = 0.0
+        self.callback_ms_hist = [0] * (len(CALLBACK_HIST_EDGES_MS) + 1)
+
+    def record_read(self, scans: int, skipped: int, device_backlog: int, ljm_backlog: int, callback_ms: float) -> None:
+        """
+        Record one stream read.
+
+        Args:
+            scans (int): The number of scans in the read.
+            skipped (int): The number of skipped samples in the read.
+            device_backlog (int): The deviceScanBacklog reported by eStreamRead.
+            ljm_backlog (int): The ljmScanBacklog reported by eStreamRead.
+            callback_ms (float): How long the callback took in milliseconds.
+        """
+        self.reads += 1
+        self.scans += scans
+        self.skipped_samples += skipped
+        self.device_backlog_max = max(self.device_backlog_max, device_backlog)
+        self.ljm_backlog_max = max(self.ljm_backlog_max, ljm_backlog)
+        self.callback_ms_max = max(self.callback_ms_max, callback_ms)
+        self.callback_ms_hist[bisect.bisect_left(CALLBACK_HIST_EDGES_MS, callback_ms)] += 1
+
+    def to_record(self, ring_dropped: int) -> Dict[str, Any]:
+        """
+        Args:
+            ring_dropped (int): The number of stream reads dropped by the ring in this period.
+
+        Returns:
+            Dict[str, Any]: The counters as a database record.
+        """
+        return {
+            "period_s": round(time.monotonic() - self.period_start, 3),
+            "reads": self.reads,
+            "scans": self.scans,
+            "skipped_samples": self.skipped_samples,
+            "device_backlog_max": self.device_backlog_max,
+            "ljm_backlog_max": self.ljm_backlog_max,
+            "ring_dropped": ring_dropped,
+            "callback_ms_max": round(self.callback_ms_max, 3),
+            "callback_ms_hist": dict(zip([str(edge) for edge in CALLBACK_HIST_EDGES_MS] + ["inf"], self.callback_ms_hist)),
+        }
 
 class _CallbackClass:
-    def __init__(self, lji: LabJack, workq_list: List[mp.Queue], scan_rate: int):
+    def __init__(self, lji: LabJack, workq_list: List[mp.Queue], scan_rate: int, ring: SharedFrameRing, scan_list: List[str] = DEFAULT_A_LIST_NAMES, device: str = DEFAULT_DEVICE_NAME):
         """
         The callback class for the LabJack T7 Pro,
         including the labjack object to read from the stream and
@@ -49,13 +528,64 @@ class _CallbackClass:
             lji (LabJack):
                 The labjack object to read from the stream
             workq_list (List[mp.Queue]):
-                The list of threads that are subscribed to the labjack data
+                The list of threads that are notified when new stream data
+                is in the ring, only one of them may read the ring.
             scan_rate (int):
                 The scan rate in Hz
+            ring (SharedFrameRing):
+                The shared memory ring the raw stream reads are written into.
+            scan_list (List[str]):
+                The list of AIN channels in the order they are streamed.
+            device (str):
+                The name of the device in the LabJack configuration.
         """
         self.lji = lji
         self.subscribed_workq_list = workq_list
         self.scan_rate = scan_rate
+        self.ring = ring
+        self.scan_list = scan_list
+        self.device = device
+
+        # Timebase of the current stream, reset whenever the stream is started
+        self.start_time_us = 0
+        self.scan_index = 0
+
+        # Counters for the current publishing period, swapped out by publish_stream_stats
+        self.stats = StreamStats()
+        self.ring_dropped = ring.dropped
+
+        # Set from the callback thread, checked by the reconnect supervisor
+        self.fault: Optional[str] = None
+        self.last_read_time = time.monotonic()
+        self.awaiting_trigger = False # A triggered stream has no timebase until its first read
+        self.burst: Optional[BurstRecorder] = None # Pre-trigger history of the stream reads
+
+def decode_ring_frame(decoder: ChannelDecoder, tags: np.ndarray, frame: np.ndarray, device: str = DEFAULT_DEVICE_NAME) -> LjData:
+    """
+    Decode a stream read taken from the shared memory ring.
+
+    Args:
+        decoder (ChannelDecoder):
+            The decoder for the scan list of the ring.
+        tags (np.ndarray):
+            The tags stored with the stream read, see RING_TAG_*.
+        frame (np.ndarray):
+            The flat data buffer of the stream read.
+        device (str):
+            The name of the device that streamed the read.
+
+    Returns:
+        LjData: The per-sensor columns with the timebase of the read.
+    """
+    lc_data, pt_data = decoder.decode(frame)
+    return LjData(
+        tags[RING_TAG_SCAN_RATE_MHZ] / 1000,
+        lc_data,
+        pt_data,
+        start_time=tags[RING_TAG_START_TIME_US] / 1e6,
+        scan_index=int(tags[RING_TAG_SCAN_INDEX]),
+        device=device
+    )
 
 def t7_pro_callback(obj: _CallbackClass, stream_handle: Any):
     """
@@ -66,95 +596,769 @@ def t7_pro_callback(obj: _CallbackClass, stream_handle: Any):
         obj (_CallbackClass): The callback class for the LabJack T7 Pro.
         stream_handle (Any): The stream handle for the LabJack T7 Pro.
     """
-    ff = obj.lji.read_stream()
+    callback_start = time.perf_counter()
+    try:
+        ff = obj.lji.read_stream()
+    except LJMError as e:
+        # Raising here would only end up in the LJM callback thread,
+        # flag the fault for the supervisor to reconnect instead
+        if obj.fault is None:
+            obj.fault = f"stream read error: {e}"
+        return
+    obj.last_read_time = time.monotonic()
+    if obj.awaiting_trigger:
+        # The first scan was taken at the trigger edge, its time stamp is only valid now
+        try:
+            obj.start_time_us = int(obj.lji.get_stream_start_host_time() * 1e6)
+        except LJMError as e:
+            print(f"LJ - {obj.device} could not read the trigger time, using the host time: {e}")
+        obj.awaiting_trigger = False
+        print(f"LJ - {obj.device} stream triggered at {obj.start_time_us / 1e6:.6f}")
+    data = np.asarray(ff[0], dtype=np.float64)
+
+    scan_index = obj.scan_index
+    scans = len(data) // len(obj.scan_list)
+    obj.scan_index += scans
+
+    if obj.burst is not None:
+        obj.burst.append(
+            obj.start_time_us / 1e6 + scan_index / obj.scan_rate, obj.scan_rate, data.reshape(scans, len(obj.scan_list))
+        )
+
+    # The raw buffer goes into shared memory, only the ring name is queued.
+    # If the ring is full the frame is dropped and counted in the ring header.
+    tags = (obj.start_time_us, int(obj.scan_rate * 1000), scan_index, ff[1], ff[2])
+    if obj.ring.write(data, tags) >= 0:
+        cmnd = WorkQCmnd(WorkQCmnd_e.LJ_RING_DATA, obj.ring.name)
+
+        for workq in obj.subscribed_workq_list:
+            workq.put(cmnd)
+
+    obj.stats.record_read(
+        scans,
+        int(np.count_nonzero(data == STREAM_SKIPPED_SAMPLE)),
+        ff[1],
+        ff[2],
+        (time.perf_counter() - callback_start) * 1000
+    )
+
+def publish_stream_stats(stream_cb_obj: _CallbackClass, db_workq: mp.Queue) -> None:
+    """
+    Log the stream counters of the period that just ended and
+    send them to the database, then start a new period.
+
+    Args:
+        stream_cb_obj (_CallbackClass):
+            The callback object holding the counters.
+        db_workq (mp.Queue):
+            The work queue for the database thread.
+    """
+    stats, stream_cb_obj.stats = stream_cb_obj.stats, StreamStats()
 
-    scan_rate = obj.scan_rate
-    lc_data = defaultdict(list)
-    pt_data = defaultdict(list)
+    ring_dropped = stream_cb_obj.ring.dropped
+    record = stats.to_record(ring_dropped - stream_cb_obj.ring_dropped)
+    record["device"] = stream_cb_obj.device
+    stream_cb_obj.ring_dropped = ring_dropped
 
-    for i in range(GET_SCANS_PER_READ(scan_rate)):
-        start_index = i * len(DEFAULT_A_LIST_NAMES)
-        data_arr = ff[0][start_index: start_index + len(DEFAULT_A_LIST_NAMES)] # for the 11 channels
+    if stats.reads == 0:
+        return
 
-        pt_data["PT14"].append(data_arr[0]) # AIN1
-        pt_data["PT13"].append(data_arr[1]) # AIN2
-        pt_data["PT12"].append(data_arr[2]) # AIN3
-        pt_data["PT11"].append(data_arr[3]) # AIN4
-        pt_data["PT10"].append(data_arr[4]) # AIN5
-        pt_data["PT9"].append(data_arr[5]) # AIN6
-        pt_data["PT8"].append(data_arr[6]) # AIN7
-        pt_data["PT7"].append(data_arr[7]) # AIN8
-        pt_data["PT6"].append(data_arr[8]) # AIN9
+    print(
+        f"LJ - {stream_cb_obj.device} stream {record['reads']} reads, {record['skipped_samples']} skipped samples, "
+        f"backlog max {record['device_backlog_max']} device / {record['ljm_backlog_max']} LJM, "
+        f"{record['ring_dropped']} reads dropped, callback max {record['callback_ms_max']} ms"
+    )
+    db_workq.put(WorkQCmnd(WorkQCmnd_e.DB_LJ_STREAM_STATS, record))
 
-        lc_data["LC6"].append(data_arr[9]) # AIN10
-        lc_data["LC5"].append(data_arr[10]) # AIN11
-        lc_data["LC4"].append(data_arr[11]) # AIN12
-        lc_data["LC3"].append(data_arr[12]) # AIN13
+def create_sample_reader(lji: LabJack, decoder: ChannelDecoder) -> RegisterBatch:
+    """
+    Create the command/response reader for slow logging, the load cell
+    reference voltage followed by the decoder's scan list.
 
-    cmnd = WorkQCmnd(WorkQCmnd_e.LJ_DATA, LjData(scan_rate, lc_data, pt_data))
+    Args:
+        lji (LabJack):
+            The LabJack T7 Pro object to read from.
+        decoder (ChannelDecoder):
+            The decoder for the AIN channels to read.
 
-    for workq in obj.subscribed_workq_list:
-        workq.put(cmnd)
+    Returns:
+        RegisterBatch: The reader, with its register addresses resolved.
+    """
+    return RegisterBatch(lji, REFERENCE_VOLTAGE_NAME + decoder.scan_list)
 
 def read_single_sample(
-        lji: LabJack,
-        a_scan_list: List[str],
+        reader: RegisterBatch,
+        decoder: ChannelDecoder,
         db_workq: mp.Queue,
-        scan_frequency: int
-    ):
+        scan_frequency: int,
+        device: str = DEFAULT_DEVICE_NAME
+    ) -> Optional[Tuple[float, float]]:
     """
     Read a single sample from the LabJack T7 Pro.
+    The load cell reference voltage is read in the same transaction.
 
     Args:
-        lji (LabJack):
-            The LabJack T7 Pro object to read from.
-        a_scan_list (List[str]):
-            The list of AIN channels to read from.
+        reader (RegisterBatch):
+            The reader from create_sample_reader.
+        decoder (ChannelDecoder):
+            The decoder for the AIN channels to read from.
         db_workq (mp.Queue):
             The work queue for the database thread.
         scan_frequency (int):
             The scan frequency in Hz.
+        device (str):
+            The name of the device in the LabJack configuration.
+
+    Returns:
+        Optional[Tuple[float, float]]:
+            The host time of the sample and the load cell reference voltage, None if the read failed.
     """
     try:
-        values = lji.read_names(a_scan_list)
+        before = time.time()
+        values = reader.read()
+        sample_time = (before + time.time()) / 2
     except LJMError as e:
-        print(f"LJ - Command/Response read error: {e}")
-        return
+        print(f"LJ - {device} command/response read error: {e}")
+        return None
 
-    pt_data = defaultdict(list)
-    lc_data = defaultdict(list)
+    n_ref = len(REFERENCE_VOLTAGE_NAME)
+    lc_data, pt_data = decoder.decode(values[n_ref:])
 
-    for name, value in zip(a_scan_list, values):
-        if name in PT_MAP:
-            pt_data[PT_MAP[name]].append(value)
-        elif name in LC_MAP:
-            lc_data[LC_MAP[name]].append(value)
-
-    cmnd = WorkQCmnd(WorkQCmnd_e.LJ_DATA, LjData(scan_frequency, lc_data, pt_data))
+    cmnd = WorkQCmnd(WorkQCmnd_e.LJ_DATA, LjData(scan_frequency, lc_data, pt_data, start_time=sample_time, device=device))
     db_workq.put(cmnd)
 
-def connect_to_labjack():
+    return sample_time, values[0]
+
+def start_t7_stream(
+        lji: LabJack,
+        stream_config: StreamConfig,
+        callback: Callable,
+        stream_cb_obj: _CallbackClass
+    ) -> bool:
+    """
+    Start the LabJack stream and record its timebase on the callback object.
+
+    Args:
+        lji (LabJack):
+            The LabJack T7 Pro object to stream from.
+        stream_config (StreamConfig):
+            The requested scan rate and scans per read.
+        callback (Callable):
+            The stream callback function.
+        stream_cb_obj (_CallbackClass):
+            The callback object, holds the scan list and receives the timebase.
+
+    Returns:
+        bool: True if the stream was started.
+    """
+    if stream_config.triggered and not LabJack.valid_stream_trigger(stream_config.trigger_line, stream_config.trigger_edge):
+        print(
+            f"LJ - {stream_cb_obj.device} error starting stream: invalid trigger "
+            f"{stream_config.trigger_edge} {stream_config.trigger_line}, the line must be FIO0 to FIO7"
+        )
+        return False
+
+    stream_cb_obj.scan_index = 0
+    stream_cb_obj.fault = None
+    stream_cb_obj.last_read_time = time.monotonic()
+    stream_cb_obj.awaiting_trigger = stream_config.triggered
+    # Provisional until the device start time stamp is read below, or on the first read of a triggered stream
+    stream_cb_obj.start_time_us = int(time.time() * 1e6)
+
+    try:
+        act_scan_rate = lji.start_stream(
+            stream_cb_obj.scan_list,
+            stream_config.scan_rate,
+            scans_per_read=stream_config.scans_per_read,
+            callback=callback,
+            obj=stream_cb_obj,
+            stream_resolution_index=stream_config.resolution_index,
+            buffer_size_bytes=stream_config.buffer_size_bytes,
+            trigger_line=stream_config.trigger_line,
+            trigger_edge=stream_config.trigger_edge,
+            clock_divisor=stream_config.clock_divisor
+        )
+        if act_scan_rate == 0:
+            print(f"LJ - {stream_cb_obj.device} error starting stream: invalid stream configuration")
+            return False
+        # LJM reports the external clock divisor as the rate, keep the configured one
+        stream_cb_obj.scan_rate = act_scan_rate if stream_config.clock_divisor == 0 else stream_config.scan_rate
+        if not stream_config.triggered:
+            stream_cb_obj.start_time_us = int(lji.get_stream_start_host_time() * 1e6)
+    except LJMError as e:
+        print(f"LJ - {stream_cb_obj.device} error starting stream: {e}")
+        return False
+
+    return True
+
+def create_lj_ring(stream_config: StreamConfig, scan_list: List[str], generation: int, device: str = DEFAULT_DEVICE_NAME) -> SharedFrameRing:
+    """
+    Create the shared memory ring for stream reads of a stream configuration,
+    sized to hold LJ_RING_BUFFER_S seconds of reads.
+
+    Args:
+        stream_config (StreamConfig):
+            The stream configuration, sets the frame length.
+        scan_list (List[str]):
+            The list of AIN channels in the order they are streamed.
+        generation (int):
+            Counts the rings created for the device, keeps their names unique.
+        device (str):
+            The name of the device in the LabJack configuration.
+
+    Returns:
+        SharedFrameRing: The ring, owned by this process.
+    """
+    capacity = max(LJ_RING_MIN_CAPACITY, math.ceil(LJ_RING_BUFFER_S / stream_config.read_period_s))
+    return SharedFrameRing.create(
+        f"lj_ring_{os.getpid()}_{device}_{generation}",
+        capacity,
+        stream_config.scans_per_read * len(scan_list),
+        LJ_RING_TAG_COUNT
+    )
+
+def load_labjack_config(config_file: str = LJ_CONFIG_JSON) -> List[LjDeviceConfig]:
     """
-    Connect to the LabJack T7 Pro.
+    Load the LabJack devices to stream from.
+
+    The file holds a "devices" list, each entry with a unique "name" and
+    optionally "scan_list", "pt_map", "lc_map", "device_type", "connection"
+    and "identifier", see LjDeviceConfig for the defaults. Without the file
+    the single default T7 is used. For a T7 on the network set "connection"
+    to "ETHERNET" and "identifier" to its IP address or serial number.
+    Per-channel input ranges and modes go in "ain_config", e.g.
+    {"default": {"voltage_range": 10}, "AIN10": {"voltage_range": 1}}.
+    A stream that starts on an edge, e.g. of the igniter line, is set with
+    "stream_trigger_line", "stream_trigger_edge" and "stream_trigger_states",
+    an external scan clock on CIO3 with "external_clock_hz".
+
+    Args:
+        config_file (str):
+            The path of the LabJack configuration file.
+
+    Returns:
+        List[LjDeviceConfig]: The device configurations.
+    """
+    if not os.path.exists(config_file):
+        print(f"LJ - {config_file} not found, using the default device")
+        return [LjDeviceConfig(DEFAULT_DEVICE_NAME)]
+
+    with open(config_file, "r") as f:
+        config = json.load(f)
+
+    devices = [LjDeviceConfig(**device) for device in config["devices"]]
+    for device in devices:
+        # Fail on invalid settings before connecting
+        ain_config_registers(device)
+        check_stream_trigger(device)
+    names = [device.name for device in devices]
+    if len(set(names)) != len(names):
+        raise ValueError(f"LabJack device names must be unique: {names}")
+
+    return devices
+
+def ain_config_registers(config: LjDeviceConfig) -> Dict[str, float]:
+    """
+    Build the analog input configuration registers of a device.
+
+    The "default" settings apply to every channel in the scan list, a
+    channel's own entry overrides them setting by setting.
+
+    Args:
+        config (LjDeviceConfig):
+            The device configuration.
+
+    Returns:
+        Dict[str, float]: Register name to value, e.g. {"AIN10_RANGE": 1}.
+
+    Raises:
+        ValueError: If a channel setting is invalid.
+    """
+    default = config.ain_config.get("default", {})
+    channels = {name: dict(default) for name in config.scan_list} if default else {}
+    for name, settings in config.ain_config.items():
+        if name != "default":
+            channels.setdefault(name, dict(default)).update(settings)
+
+    registers = {}
+    for name, settings in channels.items():
+        registers.update(AnalogInput.config_registers(name, **settings))
+    return registers
+
+def check_stream_trigger(config: LjDeviceConfig) -> None:
+    """
+    Check the stream trigger settings of a device.
+
+    Args:
+        config (LjDeviceConfig):
+            The device configuration.
+
+    Raises:
+        ValueError: If the trigger line, edge or states are invalid.
+    """
+    if config.stream_trigger_line is None:
+        return
+    if not LabJack.valid_stream_trigger(config.stream_trigger_line, config.stream_trigger_edge):
+        raise ValueError(
+            f"{config.name} stream trigger must be on FIO0 to FIO7 with an edge in {list(STREAM_TRIGGER_EDGES)}, "
+            f"not {config.stream_trigger_edge} {config.stream_trigger_line}"
+        )
+    unknown = [state for state in config.stream_trigger_states if state not in SystemStates.__members__]
+    if unknown:
+        raise ValueError(f"{config.name} stream trigger states {unknown} are not SystemStates")
+
+def connect_to_labjack(config: LjDeviceConfig):
+    """
+    Connect to a LabJack.
+
+    Args:
+        config (LjDeviceConfig):
+            The device to connect to.
 
     Returns:
         res (bool): The result of the connection.
-        LabJack: The LabJack T7 Pro object.
+        LabJack: The LabJack object.
         err (str): The error message if the connection failed.
     """
     try:
-        lji = LabJack("T7", "USB", "ANY")
+        lji = LabJack(config.device_type, config.connection, config.identifier)
     except LJMError as e:
         return False, None, str(e.errorString)
     return True, lji, ""
 
+class LabJackDevice():
+    def __init__(self, config: LjDeviceConfig, db_workq: mp.Queue, callback: Callable = t7_pro_callback, primary: bool = False):
+        """
+        One LabJack with its own channel map, stream and shared memory ring.
+        Every device's data is timestamped on the host clock and tagged with
+        its name, so the database can merge the devices into one feed.
+
+        A device that faults (stream read errors, a stalled stream or
+        repeated command/response errors) is closed and reopened with
+        backoff by the supervisor in t7_pro_thread, which then restores
+        its configuration and the current scan mode.
+
+        Args:
+            config (LjDeviceConfig):
+                The device configuration.
+            db_workq (mp.Queue):
+                The work queue for the database thread.
+            callback (Callable):
+                The stream callback function.
+            primary (bool):
+                True for the first device, whose reference voltage also applies
+                to load cells no LabJack reads, e.g. the PLC's.
+        """
+        self.config = config
+        self.name = config.name
+        self.db_workq = db_workq
+        self.callback = callback
+        self.decoder = ChannelDecoder(config.scan_list, config.pt_map, config.lc_map)
+        # Applied on every connect, only the registers the device differs in are written
+        self.ain_registers = ain_config_registers(config)
+        check_stream_trigger(config)
+
+        self.lji: Optional[LabJack] = None
+        self.sample_reader: Optional[RegisterBatch] = None
+        self.dio: Optional[DigitalPort] = None # Digital outputs, with their states mirrored
+        self.pulse_timers: Dict[str, Tuple[int, bool]] = {} # Line to the timer id that ends its pulse and the level to restore
+        self.ring: Optional[SharedFrameRing] = None
+        self.ring_generation = 0
+        self.retired_rings: List[SharedFrameRing] = [] # Replaced rings, kept until the database attaches a newer one
+        self.stream_cb_obj: Optional[_CallbackClass] = None
+        self.stream_config: Optional[StreamConfig] = None
+        self.stream_started = False
+        self.burst = BurstRecorder(config.name, config.scan_list, config.burst_pre_s, config.burst_post_s) if config.burst_pre_s > 0 else None
+
+        # Only the primary device and devices with load cells report the reference voltage
+        self.reference_load_cells = None if primary else list(self.decoder.lc_names)
+        self.lc_ref_calibrated = not primary and len(self.decoder.lc_names) == 0
+        self.last_sample_time = time.time() # Host time of the last logged sample, to measure mode handover gaps
+
+        # Reconnect state, the device starts disconnected
+        self.read_errors = 0
+        self.reconnect_delay = LJ_RECONNECT_MIN_S
+        self.reconnect_deadline = time.monotonic()
+        self.reconnect_attempts = 0
+        self.disconnect_time: Optional[float] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.lji is not None
+
+    @property
+    def connection_type(self) -> str:
+        return self.lji.get_connection_type() if self.lji is not None else self.config.connection
+
+    def connect(self) -> bool:
+        """
+        Open the device.
+
+        Returns:
+            bool: True if the device is open.
+        """
+        res, lji, err = connect_to_labjack(self.config)
+        if not res:
+            # Only the first failure and those at the longest backoff are logged
+            if self.reconnect_attempts == 0 or self.reconnect_delay >= LJ_RECONNECT_MAX_S:
+                print(f"LJ - Error connecting to {self.name} ({self.config.connection} {self.config.identifier}), {err}")
+            return False
+
+        try:
+            written = lji.apply_config(self.ain_registers) if self.ain_registers else 0
+            dio = DigitalPort(lji)
+        except LJMError as e:
+            print(f"LJ - Error configuring {self.name}, {e}")
+            try:
+                lji.close()
+            except Exception:
+                pass
+            return False
+        if written:
+            print(f"LJ - {self.name} wrote {written} of {len(self.ain_registers)} analog input settings")
+
+        self.lji = lji
+        self.dio = dio
+        self.sample_reader = create_sample_reader(lji, self.decoder)
+        if self.stream_cb_obj is not None:
+            self.stream_cb_obj.lji = lji
+        self.read_errors = 0
+        print(f"LJ - Connected to {self.name}, serial number {lji.get_serial_number()} over {lji.get_connection_type()}")
+        return True
+
+    def stream_config_for(
+            self,
+            state: Optional[SystemStates],
+            state_rates: Dict[SystemStates, int],
+            default_rate: int
+        ) -> StreamConfig:
+        """
+        Args:
+            state (Optional[SystemStates]): The state to stream for, None for the default rate.
+            state_rates (Dict[SystemStates, int]): The scan rate in Hz for each state.
+            default_rate (int): The scan rate in Hz for states without an entry in state_rates.
+
+        Returns:
+            StreamConfig: The stream configuration of this device for the state,
+                triggered if the state is one of its trigger states.
+        """
+        stream_config = StreamConfig.for_state(
+            state, self.decoder.n_channels, self.connection_type, state_rates, default_rate,
+            self.config.external_clock_hz, self.config.device_type
+        )
+        if self.config.stream_trigger_line is not None and state is not None and state.name in self.config.stream_trigger_states:
+            stream_config.trigger_line = self.config.stream_trigger_line
+            stream_config.trigger_edge = self.config.stream_trigger_edge
+        return stream_config
+
+    def pulse(self, line: str, duration_s: float, timers: TimerQueue) -> bool:
+        """
+        Invert a digital output now and restore it after a delay. A pulse on
+        a line that is already pulsing extends it instead of inverting it back.
+
+        Args:
+            line (str): The DIO channel name, e.g. "FIO0".
+            duration_s (float): The pulse length in seconds.
+            timers (TimerQueue): The timers of the LabJack loop, the restore is scheduled on it.
+
+        Returns:
+            bool: True if the pulse was started or extended.
+        """
+        if line in self.pulse_timers:
+            timer_id, idle_level = self.pulse_timers[line]
+            timers.cancel(timer_id)
+        else:
+            if not self.connected:
+                print(f"LJ - {self.name} is not connected, {line} pulse dropped")
+                return False
+            idle_level = self.dio.get_state(line)
+            try:
+                self.dio.set(line, not idle_level)
+            except LJMError as e:
+                self.read_errors += 1
+                print(f"LJ - {self.name} {line} pulse error: {e}")
+                return False
+
+        def end_pulse():
+            del self.pulse_timers[line]
+            if not self.connected:
+                print(f"LJ - {self.name} is not connected, {line} pulse not ended")
+                return
+            try:
+                self.dio.set(line, idle_level)
+            except LJMError as e:
+                self.read_errors += 1
+                print(f"LJ - {self.name} {line} pulse end error: {e}")
+
+        self.pulse_timers[line] = (timers.schedule(duration_s, end_pulse), idle_level)
+        return True
+
+    def check_fault(self) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: Why the connected device should be reopened, None if it is healthy.
+        """
+        if not self.connected:
+            return None
+        if self.read_errors >= LJ_FAULT_READ_ERRORS:
+            return f"{self.read_errors} command/response reads failed"
+        if self.stream_started and self.stream_cb_obj is not None:
+            if self.stream_cb_obj.fault is not None:
+                return self.stream_cb_obj.fault
+            if self.stream_cb_obj.awaiting_trigger:
+                return None # No data is expected before the trigger edge
+            stall_s = max(LJ_STREAM_STALL_MIN_S, LJ_STREAM_STALL_READS * self.stream_config.read_period_s)
+            if time.monotonic() - self.stream_cb_obj.last_read_time > stall_s:
+                return f"no stream data for {stall_s:.1f} s"
+        return None
+
+    def disconnect(self, reason: str) -> None:
+        """
+        Close a faulted device and schedule the first reconnect attempt.
+
+        Args:
+            reason (str): Why the device is being reopened.
+        """
+        print(f"LJ - {self.name} fault, {reason}, reconnecting")
+        if self.stream_started:
+            self.stop_stream()
+        try:
+            self.lji.close()
+        except Exception:
+            pass
+
+        self.lji = None
+        self.dio = None
+        self.sample_reader = None
+        self.disconnect_time = time.monotonic()
+        self.reconnect_attempts = 0
+        self.reconnect_delay = LJ_RECONNECT_MIN_S
+        self.reconnect_deadline = time.monotonic()
+
+    def try_reconnect(self, scan_mode: LJ_SCAN_MODE, poll_rate: int) -> bool:
+        """
+        Attempt to reopen the device once its backoff has elapsed, then resume
+        the scan mode and report how long no data was logged.
+
+        Args:
+            scan_mode (LJ_SCAN_MODE): The scan mode to resume.
+            poll_rate (int): The slow logging rate in Hz.
+
+        Returns:
+            bool: True if the device was reopened.
+        """
+        if time.monotonic() < self.reconnect_deadline:
+            return False
+
+        if not self.connect():
+            self.reconnect_attempts += 1
+            self.reconnect_delay = min(self.reconnect_delay * 2, LJ_RECONNECT_MAX_S)
+            self.reconnect_deadline = time.monotonic() + self.reconnect_delay
+            return False
+
+        # The first connection is not a recovery
+        if self.disconnect_time is None:
+            return True
+
+        gap_start = self.last_sample_time
+        if scan_mode == LJ_SCAN_MODE.FAST:
+            if self.start_stream():
+                self.last_sample_time = self.stream_cb_obj.start_time_us / 1e6
+        else:
+            self.read_sample(poll_rate)
+
+        print(
+            f"LJ - {self.name} recovered after {(time.monotonic() - self.disconnect_time) * 1000:.0f} ms "
+            f"and {self.reconnect_attempts + 1} attempt(s), {scan_mode.name.lower()} logging resumed, "
+            f"data gap {(self.last_sample_time - gap_start) * 1000:.0f} ms"
+        )
+        self.disconnect_time = None
+        return True
+
+    def configure_stream(self, stream_config: StreamConfig) -> None:
+        """
+        Set the stream configuration for the next stream start, creating the
+        ring on first use and replacing it when the read size changes. The
+        old ring is kept until the database confirms it attached the new one,
+        see release_rings, so frames it has not read yet are not lost.
+
+        Args:
+            stream_config (StreamConfig): The stream configuration.
+        """
+        self.stream_config = stream_config
+        frame_len = stream_config.scans_per_read * self.decoder.n_channels
+        if self.ring is not None and self.ring.frame_len == frame_len:
+            return
+
+        old_ring_name = None
+        if self.ring is not None:
+            old_ring_name = self.ring.name
+            self.retired_rings.append(self.ring)
+            self.ring_generation += 1
+
+        self.ring = create_lj_ring(stream_config, self.config.scan_list, self.ring_generation, self.name)
+        if self.stream_cb_obj is None:
+            self.stream_cb_obj = _CallbackClass(
+                self.lji, [self.db_workq,], stream_config.scan_rate, self.ring, self.config.scan_list, self.name
+            )
+            self.stream_cb_obj.burst = self.burst
+        else:
+            self.stream_cb_obj.ring = self.ring
+            self.stream_cb_obj.ring_dropped = self.ring.dropped
+
+        self.db_workq.put(WorkQCmnd(
+            WorkQCmnd_e.LJ_RING_ATTACH,
+            LjRingInfo(
+                self.ring.name, stream_config.scan_rate, self.config.scan_list,
+                dict(self.config.pt_map), dict(self.config.lc_map),
+                replaces=old_ring_name, device=self.name
+            )
+        ))
+
+    def release_rings(self, ring_name: str) -> None:
+        """
+        Close the replaced rings older than a ring the database attached,
+        it has read and dropped them by then.
+
+        Args:
+            ring_name (str): The name of the ring the database attached.
+        """
+        names = [ring.name for ring in self.retired_rings]
+        if self.ring is not None:
+            names.append(self.ring.name)
+        if ring_name not in names:
+            return
+
+        n_released = names.index(ring_name)
+        for ring in self.retired_rings[:n_released]:
+            ring.close()
+        del self.retired_rings[:n_released]
+
+    def start_stream(self) -> bool:
+        """
+        Start streaming with the configuration from configure_stream.
+
+        Returns:
+            bool: True if the stream was started.
+        """
+        if not self.connected:
+            return False
+        self.stream_started = start_t7_stream(
+            self.lji, self.stream_config, self.callback, self.stream_cb_obj
+        )
+        return self.stream_started
+
+    def stop_stream(self) -> None:
+        """
+        Stop the stream if it is running, recording the time of its last scan.
+        """
+        if not self.stream_started:
+            return
+        try:
+            self.lji.stop_stream()
+        except LJMError:
+            pass
+        self.stream_started = False
+        self.last_sample_time = (
+            self.stream_cb_obj.start_time_us / 1e6 + self.stream_cb_obj.scan_index / self.stream_cb_obj.scan_rate
+        )
+
+    def read_sample(self, poll_rate: int) -> bool:
+        """
+        Read and send a single sample, and the load cell reference voltage until one was sent.
+
+        Args:
+            poll_rate (int): The slow logging rate in Hz.
+
+        Returns:
+            bool: True if the sample was read.
+        """
+        if not self.connected:
+            return False
+
+        sample = read_single_sample(self.sample_reader, self.decoder, self.db_workq, poll_rate, self.name)
+        if sample is None:
+            self.read_errors += 1
+            return False
+
+        self.read_errors = 0
+        self.last_sample_time, reference_voltage = sample
+        if not self.lc_ref_calibrated:
+            self.db_workq.put(WorkQCmnd(
+                WorkQCmnd_e.LC_REFERENCE_VOLTAGE, LjReferenceVoltage(self.name, reference_voltage, self.reference_load_cells)
+            ))
+            self.lc_ref_calibrated = True
+        return True
+
+    def publish_stats(self) -> None:
+        if self.stream_cb_obj is not None:
+            publish_stream_stats(self.stream_cb_obj, self.db_workq)
+
+    @property
+    def burst_pending(self) -> bool:
+        """
+        True while a triggered burst is still capturing its post-trigger window.
+        """
+        return self.burst is not None and self.burst.triggered and not self.burst.complete and self.stream_started
+
+    def trigger_burst(self, reason: str) -> None:
+        if self.burst is not None and self.burst.trigger(reason):
+            print(f"LJ - {self.name} burst capture triggered by {reason}")
+
+    def dump_burst(self, force: bool = False) -> None:
+        """
+        Write a triggered burst to disk once its window is captured, or its
+        stream stopped before that.
+
+        Args:
+            force (bool): Write whatever part of the window was captured.
+        """
+        if self.burst is None or not self.burst.triggered:
+            return
+        if not (force or self.burst.complete or not self.stream_started):
+            return
+        if self.stream_started and not self.burst.complete:
+            self.stop_stream() # The callback must not append while the window is written
+        dump_start = time.perf_counter()
+        path = self.burst.dump()
+        if path is None:
+            print(f"LJ - {self.name} burst capture had no stream data in its window")
+        else:
+            print(f"LJ - {self.name} burst capture written to {path} in {(time.perf_counter() - dump_start) * 1000:.0f} ms")
+
+    def close(self) -> None:
+        """
+        Stop the stream, close the device and release the rings.
+        """
+        if self.lji is not None:
+            try:
+                self.lji.stop_stream()
+            except Exception:
+                pass
+            try:
+                self.lji.close()
+            except Exception:
+                pass
+            self.lji = None
+            self.dio = None
+        self.stream_started = False
+        for ring in self.retired_rings:
+            ring.close()
+        self.retired_rings.clear()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
 def t7_pro_thread(
         t7_pro_workq: mp.Queue,
         db_workq: mp.Queue,
-        a_scan_list: List[str] = DEFAULT_A_LIST_NAMES,
+        device_configs: Optional[List[LjDeviceConfig]] = None,
+        scan_rate: int = STREAM_RATE_HZ,
+        state_rates: Dict[SystemStates, int] = STATE_STREAM_RATE_HZ,
+        state_poll_rates: Dict[SystemStates, int] = STATE_CMD_RESPONSE_RATE_HZ,
         labjack_stream_callback: Callable = t7_pro_callback):
     """
-    Start the LabJack stream to stream sensor data to
+    Start the LabJack streams to stream sensor data to
     the database thread.
 
     Args:
@@ -164,119 +1368,196 @@ def t7_pro_thread(
         db_workq (mp.Queue):
             The work queue for the database thread. Used for
             storing sensor data in the database.
-        a_scan_list (List[str]):
-            The list of AIN channels to stream from the LabJack T7 Pro.
-            Default is DEFAULT_A_LIST_NAMES.
+        device_configs (Optional[List[LjDeviceConfig]]):
+            The LabJacks to stream from, each with its own scan list and
+            channel maps. Default is the devices in LabJackConfig.json.
+            Digital outputs are driven on the first device.
+        scan_rate (int):
+            The stream scan rate in Hz for states without an entry
+            in state_rates. Default is STREAM_RATE_HZ.
+        state_rates (Dict[SystemStates, int]):
+            The stream scan rate in Hz for each state, selected by the state
+            sent with LJ_FAST_LOGGING. Default is STATE_STREAM_RATE_HZ.
+        state_poll_rates (Dict[SystemStates, int]):
+            The slow logging rate in Hz for each state, selected by the state
+            sent with LJ_SLOW_LOGGING. Default is STATE_CMD_RESPONSE_RATE_HZ.
         labjack_stream_callback (function):
-            !! IF USING A CUSTOM a_scan_list, YOU MUST PROVIDE A CUSTOM CALLBACK FUNCTION.
             The callback function for the LabJack T7 Pro,
             for when the LabJack T7 Pro receives stream data.
-            Default is t7_pro_callback.
+            Default is t7_pro_callback, which works for any scan list.
     """
-    a_scan_list_names = a_scan_list
-    stream_resolution_index = 4
-    lji = None
+    if device_configs is None:
+        device_configs = load_labjack_config()
+
+    devices = [
+        LabJackDevice(config, db_workq, labjack_stream_callback, primary=(i == 0)) for i, config in enumerate(device_configs)
+    ]
+    primary = devices[0]
 
     scan_mode = LJ_SCAN_MODE.SLOW
 
-    # Connect to the LabJack T7 Pro
-    while lji is None:
-        res, lji, err = connect_to_labjack()
-        if not res:
-            print(f"LJ - Error connecting to LabJack, {err}, retrying...")
-            time.sleep(5)
+    # Devices that are not there yet are picked up by the reconnect supervisor
+    for device in devices:
+        device.try_reconnect(scan_mode, CMD_RESPONSE_RATE_HZ)
 
-    print("LJ - thread started")
+    print(f"LJ - thread started with {len(devices)} device(s)")
 
-    lc_ref_calibrated = False
-    stream_started = False
+    # Stream reads are handed to the database process through shared memory
+    for device in devices:
+        device.configure_stream(device.stream_config_for(None, state_rates, scan_rate))
 
-    try:
-        reference_voltage = lji.read_names(REFERENCE_VOLTAGE_NAME)[0]
-        db_workq.put(WorkQCmnd(WorkQCmnd_e.LC_REFERENCE_VOLTAGE, reference_voltage))
-        lc_ref_calibrated = True
-    except LJMError as e:
-        print(f"LJ - Unable to get Load cell reference voltage: {e}")
+    # Periodic jobs run on monotonic deadlines, commands are handled as soon as they arrive
+    poll_rate = CMD_RESPONSE_RATE_HZ
+    sample_deadline = PeriodicDeadline(1.0 / poll_rate)
+    stream_retry_deadline = PeriodicDeadline(STREAM_RETRY_PERIOD_S)
+    supervisor_deadline = PeriodicDeadline(LJ_SUPERVISOR_PERIOD_S)
+    stats_deadline = PeriodicDeadline(STREAM_STATS_PERIOD_S, time.monotonic() + STREAM_STATS_PERIOD_S)
+    timers = TimerQueue() # One-shot jobs such as ending DIO pulses
 
-    stream_cb_obj = _CallbackClass(lji, [db_workq,], STREAM_RATE_HZ)
+    # A slow logging switch waits while a burst captures its post-trigger window
+    deferred_slow: Optional[WorkQCmnd] = None
+    deferred_slow_until: Optional[float] = None
 
     while True:
-        start = time.time()
-        try:
-            lj_command = t7_pro_workq.get(timeout=0.01)
-        except:
-            lj_command = None
+        streams_started = all(device.stream_started for device in devices if device.connected)
+
+        # Block on the work queue until the next periodic job is due
+        now = time.monotonic()
+        wait_s = min(stats_deadline.time_until(now), supervisor_deadline.time_until(now), timers.time_until(now))
+        if scan_mode == LJ_SCAN_MODE.SLOW:
+            wait_s = min(wait_s, sample_deadline.time_until(now))
+        elif not streams_started:
+            wait_s = min(wait_s, stream_retry_deadline.time_until(now))
+
+        if deferred_slow is not None and (
+                not any(device.burst_pending for device in devices) or time.monotonic() >= deferred_slow_until):
+            lj_command, deferred_slow = deferred_slow, None
+        else:
+            try:
+                lj_command = t7_pro_workq.get(timeout=wait_s) if wait_s > 0 else t7_pro_workq.get_nowait()
+            except queue.Empty:
+                lj_command = None
 
         if lj_command is not None:
             if lj_command.command == WorkQCmnd_e.KILL_PROCESS:
-                try:
-                    lji.stop_stream()
-                    lji.close()
-                    stream_started = False
-                except:
-                    pass
+                for device in devices:
+                    device.dump_burst(force=True)
+                    device.close()
                 print("LJ - thread stopped")
                 return
             elif lj_command.command == WorkQCmnd_e.LJ_SLOW_LOGGING:
-                print("LJ - Switching to slow logging")
-                try:
-                    lji.stop_stream()
-                    stream_started = False
-                except:
-                    pass
+                poll_rate = state_poll_rates.get(lj_command.data, CMD_RESPONSE_RATE_HZ)
+                sample_deadline.set_period(1.0 / poll_rate)
+                if scan_mode == LJ_SCAN_MODE.SLOW:
+                    print(f"LJ - Slow logging at {poll_rate} Hz")
+                    continue
+                if deferred_slow_until is None and any(device.burst_pending for device in devices):
+                    post_s = max(device.burst.post_s for device in devices if device.burst is not None)
+                    deferred_slow_until = time.monotonic() + post_s + BURST_HOLD_MARGIN_S
+                    deferred_slow = lj_command
+                    print("LJ - Slow logging held until the burst capture window is complete")
+                    continue
+                deferred_slow_until = None
+
+                # The devices cannot be polled while they stream, so stop the streams
+                # and take the first slow samples straight away
+                command_time = time.time()
                 scan_mode = LJ_SCAN_MODE.SLOW
+                for device in devices:
+                    device.stop_stream()
+                    stream_end_time = device.last_sample_time
+                    if device.read_sample(poll_rate):
+                        print(
+                            f"LJ - {device.name} switched to slow logging at {poll_rate} Hz, "
+                            f"last scan at {stream_end_time:.6f}, "
+                            f"first sample {(device.last_sample_time - stream_end_time) * 1000:.1f} ms later, "
+                            f"{(device.last_sample_time - command_time) * 1000:.1f} ms after the command"
+                        )
+                    else:
+                        print(f"LJ - {device.name} switched to slow logging at {poll_rate} Hz, last scan at {stream_end_time:.6f}")
+                sample_deadline.reset()
+                sample_deadline.due()
             elif lj_command.command == WorkQCmnd_e.LJ_FAST_LOGGING:
-                print("LJ - Switching to fast logging")
+                deferred_slow = None # The newer state wins
+                deferred_slow_until = None
+                new_configs = [device.stream_config_for(lj_command.data, state_rates, scan_rate) for device in devices]
+                if scan_mode == LJ_SCAN_MODE.FAST and streams_started and all(
+                    config == device.stream_config for config, device in zip(new_configs, devices)
+                ):
+                    # Already streaming with this configuration, nothing to change
+                    print(f"LJ - Fast logging at {primary.stream_config.scan_rate} Hz")
+                    continue
+
+                command_time = time.time()
+                for device, config in zip(devices, new_configs):
+                    if device.stream_started and config == device.stream_config:
+                        continue
+                    if scan_mode == LJ_SCAN_MODE.SLOW:
+                        # One last slow sample right before the stream starts bounds the unlogged window
+                        device.read_sample(poll_rate)
+                    device.stop_stream()
+                    device.configure_stream(config)
+
+                    if device.start_stream() and config.triggered:
+                        print(
+                            f"LJ - {device.name} armed fast logging at {device.stream_cb_obj.scan_rate:.0f} Hz "
+                            f"on the {config.trigger_edge.lower()} edge of {config.trigger_line}, "
+                            f"{(time.time() - command_time) * 1000:.1f} ms after the command"
+                        )
+                    elif device.stream_started:
+                        stream_start_time = device.stream_cb_obj.start_time_us / 1e6
+                        print(
+                            f"LJ - {device.name} switched to fast logging at {device.stream_cb_obj.scan_rate:.0f} Hz, "
+                            f"{config.scans_per_read} scans per read, first scan at {stream_start_time:.6f}, "
+                            f"{(stream_start_time - device.last_sample_time) * 1000:.1f} ms after the last sample, "
+                            f"{(stream_start_time - command_time) * 1000:.1f} ms after the command"
+                        )
                 scan_mode = LJ_SCAN_MODE.FAST
-                try:
-                    lji.stop_stream()
-                    lji.start_stream(
-                        a_scan_list_names,
-                        STREAM_RATE_HZ,
-                        scans_per_read=GET_SCANS_PER_READ(STREAM_RATE_HZ),
-                        callback=labjack_stream_callback,
-                        obj=stream_cb_obj,
-                        stream_resolution_index=stream_resolution_index
-                    )
-                    stream_started = True
-                except LJMError as e:
-                    print(f"LJ - Error starting stream: {e}")
-                    stream_started = False
+            elif lj_command.command == WorkQCmnd_e.LJ_RING_ATTACHED:
+                for device in devices:
+                    device.release_rings(lj_command.data)
+            elif lj_command.command == WorkQCmnd_e.LJ_BURST_TRIGGER:
+                for device in devices:
+                    device.trigger_burst(lj_command.data)
+            elif lj_command.command == WorkQCmnd_e.LJ_DIO_PULSE:
+                pulse = lj_command.data
+                if primary.pulse(pulse.line, pulse.duration_s, timers):
+                    print(f"LJ - {pulse.line} pulse for {pulse.duration_s:.3f} s")
             elif lj_command.command == WorkQCmnd_e.LJ_FIO0_TOGGLE:
+                if not primary.connected:
+                    print(f"LJ - FIO_TOGGLE error: {primary.name} is not connected")
+                    continue
                 try:
-                    dio0 = DigitalOutput(lji, "FIO0")  # ensures _DIR = 1
-                    dio0.toggle()
-                except Exception as e:
+                    primary.dio.toggle("FIO0") # One write from the mirrored state, also sets the line to output
+                except LJMError as e:
+                    primary.read_errors += 1
                     print(f"LJ - FIO_TOGGLE error: {e}")
 
 
-        if scan_mode == LJ_SCAN_MODE.SLOW:
+        now = time.monotonic()
+        timers.run_due(now)
+
+        if supervisor_deadline.due(now):
+            # Reopen faulted devices and resume the current scan mode on them
+            for device in devices:
+                reason = device.check_fault()
+                if reason is not None:
+                    device.disconnect(reason)
+                if not device.connected:
+                    device.try_reconnect(scan_mode, poll_rate)
+                device.dump_burst()
+
+        if scan_mode == LJ_SCAN_MODE.SLOW and sample_deadline.due(now):
             # If in slow mode, read single samples
-            read_single_sample(lji, a_scan_list_names, db_workq, CMD_RESPONSE_RATE_HZ)
-            if not lc_ref_calibrated:
-                try:
-                    reference_voltage = lji.read_names(REFERENCE_VOLTAGE_NAME)[0]
-                    db_workq.put(WorkQCmnd(WorkQCmnd_e.LC_REFERENCE_VOLTAGE, reference_voltage))
-                    lc_ref_calibrated = True
-                except LJMError as e:
-                    print(f"LJ - Unable to get Load cell reference voltage: {e}")
+            for device in devices:
+                device.read_sample(poll_rate)
 
-        elif (not stream_started and scan_mode == LJ_SCAN_MODE.FAST):
-            # If in fast mode, read from the stream
-            try:
-                lji.start_stream(
-                    a_scan_list_names,
-                    STREAM_RATE_HZ,
-                    scans_per_read=GET_SCANS_PER_READ(STREAM_RATE_HZ),
-                    callback=labjack_stream_callback,
-                    obj=stream_cb_obj,
-                    stream_resolution_index=stream_resolution_index
-                )
-                stream_started = True
-            except LJMError as e:
-                print(f"LJ - Error starting stream: {e}")
-                stream_started = False
+        elif scan_mode == LJ_SCAN_MODE.FAST and not streams_started and stream_retry_deadline.due(now):
+            # If in fast mode, retry starting the streams that failed to start
+            for device in devices:
+                if device.connected and not device.stream_started:
+                    device.start_stream()
 
-        # CR rate
-        elapsed = time.time() - start
-        time.sleep(max(0, CMD_RESPONSE_PERIOD - elapsed))
\ No newline at end of file
+        if stats_deadline.due(now):
+            for device in devices:
+                device.publish_stats()
@@ -2,7 +2,7 @@
 import os
 import numpy as np
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 import json
 from pathlib import Path
 
@@ -18,6 +18,7 @@ class LoadCell():
         self.slope = 0.0
         self.intercept = 0.0
         self.calibration_voltages = [] # List of voltages in Volts
+        self.nominal_voltages = [] # Calibration voltages at the nominal 10 V reference
         self.calibration_weights = [] # List of weights in kg
 
     def set_calibration_voltages(self, voltages_mV: List[float]) -> None:
@@ -28,7 +29,8 @@ class LoadCell():
         Args:
             voltages_mV (List[float]): A list of voltage readings from the load cell in millivolts.
         """
-        self.calibration_voltages = [v / 1000 * AMPLIFIER_BOARD_MULTIPLIER for v in voltages_mV]
+        self.nominal_voltages = [v / 1000 * AMPLIFIER_BOARD_MULTIPLIER for v in voltages_mV]
+        self.calibration_voltages = list(self.nominal_voltages)
 
     def set_calibration_weights(self, weights_lbs: List[float]) -> None:
         """
@@ -44,6 +46,8 @@ class LoadCell():
         """
         Applies the reference voltage to the load cell voltage calibrations.
         This is used to adjust the calibration data based on the reference voltage.
+        The calibration is scaled from its nominal voltages, so applying a new
+        reference replaces the previous one.
 
         Args:
             ref_voltage (float): The reference voltage in Volts.
@@ -52,7 +56,7 @@ class LoadCell():
             print(f"LC - Invalid reference voltage {ref_voltage} for {self.load_cell_name}.")
             return
 
-        self.calibration_voltages = [v * ref_voltage / 10 for v in self.calibration_voltages]
+        self.calibration_voltages = [v * ref_voltage / 10 for v in self.nominal_voltages]
 
     def set_calibration(self) -> None:
         """
@@ -84,12 +88,29 @@ class LoadCell():
             return -999
         return raw_voltage * self.slope + self.intercept
 
+    def convert_voltages_to_mass(self, raw_voltages: np.ndarray) -> np.ndarray:
+        """
+        Converts a column of raw voltage readings from the load cell to mass values in one operation.
+
+        Args:
+            raw_voltages (np.ndarray): The raw voltage readings from the load cell.
+
+        Returns:
+            np.ndarray: The calculated mass values based on the calibration data.
+        """
+        if self.slope == 0.0 and self.intercept == 0.0:
+            print(f"LC - Load cell {self.load_cell_name} has not been calibrated.")
+            return np.full(len(raw_voltages), -999.0)
+        return raw_voltages * self.slope + self.intercept
+
 class LoadCellHandler():
     loadCells: Dict[str, LoadCell]
 
     def __init__(self):
         """Initializes the LoadCellHandler and loads the load cell configurations from a JSON file."""
         self.loadCells = {}
+        self.reference_devices: Dict[str, str] = {} # Load cell name to the LabJack whose reference voltage it uses
+        self.missing_warned = set() # Unknown load cell names already reported
         try:
             with open(EXPECTED_SCHEMA_JSON, 'r') as f:
                 data = json.load(f)
@@ -101,6 +122,12 @@ class LoadCellHandler():
         except Exception as e:
             print(f"LC - Error loading LoadCellConfig file: {e}")
 
+    def warn_missing(self, load_cell_name: str) -> None:
+        """Reports a load cell missing from LoadCellConfig.json once, its data is passed through unconverted."""
+        if load_cell_name not in self.missing_warned:
+            print(f"LC - Load cell {load_cell_name} does not exist, logging its raw voltage.")
+            self.missing_warned.add(load_cell_name)
+
     def convert_raw_voltage(self, load_cell_name: str, raw_voltage: float) -> float:
         """Returns the LoadCell object for the given load cell name.
 
@@ -110,21 +137,59 @@ class LoadCellHandler():
 
         Returns:
             float: The calculated mass value based on the
-            calibration data of the specified load cell.
+            calibration data of the specified load cell,
+            the raw voltage if the load cell is not configured.
         """
         if load_cell_name not in self.loadCells:
-            print(f"LC - Load cell {load_cell_name} does not exist.")
+            self.warn_missing(load_cell_name)
+            return raw_voltage
 
         return self.loadCells[load_cell_name].convert_voltage_to_mass(raw_voltage)
 
-    def apply_reference_voltage(self, ref_voltage: float) -> None:
+    def convert_raw_voltages(self, load_cell_name: str, raw_voltages: np.ndarray) -> np.ndarray:
+        """Converts a column of raw voltages for the given load cell name to masses.
+
+        Args:
+            load_cell_name (str): The name of the load cell to retrieve.
+            raw_voltages (np.ndarray): The raw voltage readings from the load cell.
+
+        Returns:
+            np.ndarray: The calculated mass values based on the
+            calibration data of the specified load cell,
+            the raw voltages if the load cell is not configured.
         """
-        Applies the reference voltage to all load cells in the handler.
+        if load_cell_name not in self.loadCells:
+            self.warn_missing(load_cell_name)
+            return raw_voltages
+
+        return self.loadCells[load_cell_name].convert_voltages_to_mass(raw_voltages)
+
+    def apply_reference_voltage(self, ref_voltage: float, device: str = "", load_cells: Optional[List[str]] = None) -> None:
+        """
+        Applies a LabJack's reference voltage to the load cells it excites.
+
+        Each load cell keeps the reference of the device that reads it. Load
+        cells no device has claimed, such as the PLC's, use the reference
+        sent without a load cell list, which comes from the primary LabJack.
 
         Args:
             ref_voltage (float):
                 The reference voltage in Volts.
+            device (str):
+                The name of the LabJack that measured the reference.
+            load_cells (Optional[List[str]]):
+                The load cells the device reads, None for every load cell
+                no other device reads.
         """
-        for lc in self.loadCells.values():
-            lc.apply_reference_voltage(ref_voltage)
-            lc.set_calibration()
\ No newline at end of file
+        if load_cells is not None:
+            for name in load_cells:
+                self.reference_devices[name] = device
+        else:
+            load_cells = [name for name in self.loadCells if self.reference_devices.get(name, device) == device]
+
+        for name in load_cells:
+            if name not in self.loadCells:
+                print(f"LC - Load cell {name} does not exist.")
+                continue
+            self.loadCells[name].apply_reference_voltage(ref_voltage)
+            self.loadCells[name].set_calibration()
\ No newline at end of file
@@ -1,19 +1,43 @@
 # General imports =================================================================================
+from collections import deque
 import multiprocessing as mp
-from socket import socket, AF_INET, SOCK_STREAM
+import queue
+from socket import socket, AF_INET, IPPROTO_TCP, SOCK_STREAM, TCP_NODELAY
 import struct
 import threading
 import time
-from typing import Union
+from typing import Dict, Optional, Union
 from StateTruth import SystemStates
 from br_threading.WorkQCommands import WorkQCmnd, WorkQCmnd_e
-from dataclasses import dataclass
+from br_util.PeriodicDeadline import PeriodicDeadline
+from dataclasses import dataclass, field
 
 # Constants ========================================================================================
 PLC_IP = "192.168.8.70"
 PLC_PORT = 69
 
-REQUEST_DELAY = (1.0/15.0) # in seconds
+PLC_POLL_RATE_HZ = 15 # Poll rate for states without an entry in STATE_PLC_POLL_RATE_HZ
+REQUEST_DELAY = (1.0/PLC_POLL_RATE_HZ) # in seconds
+
+# Poll rate in Hz for each state, picked up from the state light command
+STATE_PLC_POLL_RATE_HZ = {
+    SystemStates.IGNITION: 50,
+    SystemStates.FIRE: 100,
+}
+
+# Commands handled before anything else queued, polling pauses until they are sent
+PLC_PRIORITY_COMMANDS = {
+    WorkQCmnd_e.KILL_PROCESS,
+    WorkQCmnd_e.PLC_OPEN_PBV,
+    WorkQCmnd_e.PLC_CLOSE_PBV,
+    WorkQCmnd_e.PLC_OPEN_SOL,
+    WorkQCmnd_e.PLC_CLOSE_SOL,
+    WorkQCmnd_e.PLC_IGN_ON,
+    WorkQCmnd_e.PLC_IGN_OFF,
+    WorkQCmnd_e.PLC_RELAY_BATCH,
+    WorkQCmnd_e.PLC_STATE_LIGHT_COMMAND,
+}
+PLC_LATENCY_REPORT_S = 30.0 # How often the enqueue-to-send latency summary is printed
 PT_COEFFICIENT = 1000
 
 # PLC Commands and Offsets
@@ -24,11 +48,29 @@ SOL_OFFSET = 20
 
 PLC_IGN_OFFSET = 25
 
-# PLC data sizes
-PLC_TC_DATA_SIZE = 9 * 2 # 9 TCs 2 LCs and each are int16_t
-PLC_LC_DATA_SIZE = 3 * 2 # 3 LCs all int16_t
-PLC_PT_DATA_SIZE = 5 * 2 # 5 PTs and each are int16_t
-PLC_VALVE_DATA_SIZE = 18 # 18 valves and each are int8_t
+# Relay offset and state of each actuation command, the relay is the offset plus
+# the valve, solenoid or igniter number, e.g. PBV 1 = relay 10, solenoid 1 = relay 21
+PLC_RELAY_COMMANDS = {
+    WorkQCmnd_e.PLC_OPEN_PBV: (PLC_PBV_OFFSET, 1),
+    WorkQCmnd_e.PLC_CLOSE_PBV: (PLC_PBV_OFFSET, 0),
+    WorkQCmnd_e.PLC_OPEN_SOL: (SOL_OFFSET, 1),
+    WorkQCmnd_e.PLC_CLOSE_SOL: (SOL_OFFSET, 0),
+    WorkQCmnd_e.PLC_IGN_ON: (PLC_IGN_OFFSET, 1),
+    WorkQCmnd_e.PLC_IGN_OFF: (PLC_IGN_OFFSET, 0),
+}
+
+# PLC data counts, in the order they are sent
+PLC_TC_COUNT = 9 # 9 TCs, each int16_t
+PLC_LC_COUNT = 3 # 3 LCs, each int16_t
+PLC_PT_COUNT = 5 # 5 PTs, each int16_t
+PLC_VALVE_COUNT = 18 # 18 valves, each uint8_t
+
+# A response frame is the TCs, LCs, PTs and valves back to back, 52 bytes
+PLC_FRAME = struct.Struct(f"<{PLC_TC_COUNT}h{PLC_LC_COUNT}h{PLC_PT_COUNT}h{PLC_VALVE_COUNT}B")
+PLC_LC_START = PLC_TC_COUNT
+PLC_PT_START = PLC_LC_START + PLC_LC_COUNT
+PLC_VALVE_START = PLC_PT_START + PLC_PT_COUNT
+PLC_UNKNOWN_COMMAND = b'Unknown command' # Sent instead of a frame for a command the PLC does not know
 
 #PLC Light Numbers
 PLC_ABORT_LIGHT = 28
@@ -39,13 +81,14 @@ PLC_FIRE_LIGHT = 32
 PLC_POST_FIRE_LIGHT = 33
 
 # Class Definitions ===============================================================================
-@dataclass
+@dataclass(slots=True)
 class PlcData():
-    tc_data: list
-    lc_data: list
-    pt_data: list
-    valve_data: list
+    tc_data: tuple
+    lc_data: tuple
+    pt_data: tuple
+    valve_data: tuple
     scan_rate: float = REQUEST_DELAY
+    timestamp: float = field(default_factory=time.time) # Unix time the response was read
 
 class PlcHandler():
     def __init__(self, plc_workq: mp.Queue):
@@ -59,6 +102,19 @@ class PlcHandler():
             PlcHandler.socket.settimeout(5)
 
         PlcHandler.plc_workq = plc_workq
+        # Commands are a few bytes, send them at once instead of waiting on the previous ACK
+        PlcHandler.socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        # Commands and poll requests are sent from different threads, a failed
+        # connection is only replaced once, by the first thread to see it fail
+        if not hasattr(PlcHandler, "send_lock"):
+            PlcHandler.send_lock = threading.Lock()
+            PlcHandler.reconnect_lock = threading.Lock()
+            PlcHandler.generation = 0
+        PlcHandler.generation += 1
+
+        # Responses are received into one buffer, reused for every poll
+        PlcHandler.frame = bytearray(PLC_FRAME.size)
+        PlcHandler.frame_view = memoryview(PlcHandler.frame)
         print("PLC - thread started")
 
     @staticmethod
@@ -77,6 +133,25 @@ class PlcHandler():
             return False
 
 
+    @staticmethod
+    def reconnect(failed_generation: int) -> None:
+        """
+        Replace a failed connection, unless another thread already did.
+
+        Args:
+            failed_generation (int):
+                The connection generation the caller saw fail.
+        """
+        with PlcHandler.reconnect_lock:
+            if PlcHandler.generation != failed_generation:
+                return
+            print("PLC - Retrying connection...")
+            try:
+                PlcHandler.socket.close()
+            except OSError:
+                pass
+            PlcHandler(PlcHandler.plc_workq)
+
     @staticmethod
     def send_command(command: bytes) -> None:
         """
@@ -86,48 +161,218 @@ class PlcHandler():
             command (bytes):
                 The command to send to the PLC.
         """
-        PlcHandler.socket.send(command)
+        with PlcHandler.send_lock:
+            PlcHandler.socket.sendall(command)
+
+    @staticmethod
+    def recv_exact(view: memoryview) -> None:
+        """
+        Receive exactly len(view) bytes into view, TCP may deliver a frame in several pieces.
+
+        Args:
+            view (memoryview):
+                The part of the frame buffer to fill.
+
+        Raises:
+            ConnectionError: If the PLC closed the connection.
+            TimeoutError: If the PLC stopped sending mid-frame.
+        """
+        received = 0
+        while received < len(view):
+            n = PlcHandler.socket.recv_into(view[received:])
+            if n == 0:
+                raise ConnectionError("PLC closed the connection")
+            received += n
+
+    @staticmethod
+    def read_frame() -> Optional[bytes]:
+        """
+        Receive one response frame from the PLC.
+
+        The frame is received in full, so a response split across TCP
+        segments cannot shift the next one. The start of the frame is
+        checked for the PLC's unknown command reply first, which is
+        shorter than a frame.
+
+        Returns:
+            Optional[bytes]: The raw frame, None for an unknown command reply.
+        """
+        view = PlcHandler.frame_view
+        head = len(PLC_UNKNOWN_COMMAND)
+        PlcHandler.recv_exact(view[:head])
+        if view[:head] == PLC_UNKNOWN_COMMAND:
+            print("PLC - Unknown Command")
+            return None
+        PlcHandler.recv_exact(view[head:])
+        return bytes(PlcHandler.frame)
+
+    @staticmethod
+    def decode_frame(frame: bytes, timestamp: float, period_s: float = REQUEST_DELAY) -> PlcData:
+        """
+        Decode a response frame.
+
+        Args:
+            frame (bytes): The raw frame from read_frame.
+            timestamp (float): The Unix time the frame was received.
+            period_s (float): The poll period the frame was requested at.
+
+        Returns:
+            PlcData: The PLC data.
+        """
+        values = PLC_FRAME.unpack_from(frame)
+        return PlcData(
+            values[:PLC_LC_START],
+            values[PLC_LC_START:PLC_PT_START],
+            tuple(x / PT_COEFFICIENT for x in values[PLC_PT_START:PLC_VALVE_START]),
+            values[PLC_VALVE_START:],
+            period_s,
+            timestamp,
+        )
 
     @staticmethod
     def read_response() -> Union[PlcData, None]:
         """
-        Read the response from the PLC.
+        Read and decode one response frame from the PLC.
 
         Returns:
             Union[PlcData, None]: The PLC data if the response is valid, otherwise None.
         """
+        frame = PlcHandler.read_frame()
+        if frame is None:
+            return None
+        return PlcHandler.decode_frame(frame, time.time())
 
-        tc_raw = PlcHandler.socket.recv(PLC_TC_DATA_SIZE)
-        lc_raw = PlcHandler.socket.recv(PLC_LC_DATA_SIZE)
-        pt_raw = PlcHandler.socket.recv(PLC_PT_DATA_SIZE)
-        valve_raw = PlcHandler.socket.recv(PLC_VALVE_DATA_SIZE)
+class CommandLatency():
+    def __init__(self):
+        """
+        Time from a command being queued to it being sent to the PLC,
+        per command type, since the last report.
+        """
+        self.reset()
 
-        # Check if the received data is of the expected size
-        if(
-            len(tc_raw) < PLC_TC_DATA_SIZE or
-            len(lc_raw) < PLC_LC_DATA_SIZE or
-            len(pt_raw) < PLC_PT_DATA_SIZE or
-            len(valve_raw) < PLC_VALVE_DATA_SIZE
-        ):
-            print("PLC - Error reading response, received incomplete data")
-            return None
+    def reset(self) -> None:
+        self.period_start = time.monotonic()
+        self.count: Dict[WorkQCmnd_e, int] = {}
+        self.total_s: Dict[WorkQCmnd_e, float] = {}
+        self.max_s: Dict[WorkQCmnd_e, float] = {}
 
-        tc_data = list(struct.unpack('<' + 'h' * (PLC_TC_DATA_SIZE //2),  tc_raw))
+    def record(self, command: WorkQCmnd_e, latency_s: float) -> None:
+        self.count[command] = self.count.get(command, 0) + 1
+        self.total_s[command] = self.total_s.get(command, 0.0) + latency_s
+        self.max_s[command] = max(self.max_s.get(command, 0.0), latency_s)
 
-        if b'Unknown command' == tc_data:
-            print("PLC - Unknown Command")
-            return None
+    def report_if_due(self) -> None:
+        """
+        Print the mean and maximum latency of each command type once
+        PLC_LATENCY_REPORT_S has passed, if any command was sent.
+        """
+        if time.monotonic() - self.period_start < PLC_LATENCY_REPORT_S:
+            return
+        if self.count:
+            summary = ", ".join(
+                f"{command.name} {count}x mean {self.total_s[command] / count * 1000:.1f} ms max {self.max_s[command] * 1000:.1f} ms"
+                for command, count in self.count.items()
+            )
+            print(f"PLC - Command latency: {summary}")
+        self.reset()
+
+class PlcPoller():
+    def __init__(self, db_workq: mp.Queue, rate_hz: float = PLC_POLL_RATE_HZ):
+        """
+        Polls the PLC for data from its own thread on a drift-free schedule,
+        so valve commands never queue behind poll requests in the work queue.
 
-        lc_data = list(struct.unpack('<' + 'h' * (PLC_LC_DATA_SIZE //2),  lc_raw))
-        pt_data = list(struct.unpack('<' + 'h' * (PLC_PT_DATA_SIZE //2),  pt_raw))
-        pt_data = [x / PT_COEFFICIENT for x in pt_data]
-        valve_data = list(valve_raw)
+        Each response is read right after its request and stamped when it
+        arrives. Received frames are decoded and sent to the database from
+        a second thread.
 
-        return PlcData(tc_data, lc_data, pt_data, valve_data)
+        Args:
+            db_workq (mp.Queue):
+                The work queue for the database.
+            rate_hz (float):
+                The initial poll rate in Hz.
+        """
+        self.db_workq = db_workq
+        self.deadline = PeriodicDeadline(1.0 / rate_hz)
+        self.frames: queue.Queue = queue.Queue()
+        self.running = True
+        self.commands_idle = threading.Event() # Cleared while priority commands are being sent
+        self.commands_idle.set()
+
+        self.poll_thread = threading.Thread(target=self.poll_loop, daemon=True)
+        self.decode_thread = threading.Thread(target=self.decode_loop, daemon=True)
+        self.poll_thread.start()
+        self.decode_thread.start()
+
+    def set_rate(self, rate_hz: float) -> None:
+        if abs(self.deadline.period_s - 1.0 / rate_hz) > 1e-9:
+            self.deadline.set_period(1.0 / rate_hz)
+            print(f"PLC - Polling at {rate_hz:g} Hz")
+
+    def poll_now(self) -> None:
+        self.deadline.reset()
+
+    def hold(self) -> None:
+        self.commands_idle.clear()
+
+    def release(self) -> None:
+        self.commands_idle.set()
+
+    def stop(self) -> None:
+        self.running = False
+        self.frames.put(None)
+
+    def poll_loop(self) -> None:
+        request = int.to_bytes(PLC_REQUEST, 1, "little") + int.to_bytes(0, 1, "little")
+
+        while self.running:
+            time.sleep(self.deadline.time_until())
+            if not self.running:
+                return
+            self.commands_idle.wait() # Priority commands go first
+            self.deadline.due()
+            period_s = self.deadline.period_s
+            generation = PlcHandler.generation
+
+            try:
+                PlcHandler.send_command(request)
+                frame = PlcHandler.read_frame()
+                if frame is not None:
+                    self.frames.put((frame, time.time(), period_s))
+            except OSError as e:
+                # A partial frame is discarded with the old connection
+                if generation == PlcHandler.generation:
+                    print(f"PLC - Poll error: {e}")
+                PlcHandler.reconnect(generation)
+
+    def decode_loop(self) -> None:
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            frame, timestamp, period_s = item
+            self.db_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_DATA, PlcHandler.decode_frame(frame, timestamp, period_s)))
 
 # Procedures ======================================================================================
 
-def process_workq_message(message: WorkQCmnd, db_workq: mp.Queue) -> bool:
+def encode_relay_command(command: WorkQCmnd_e, number: int) -> bytes:
+    """
+    Encode an actuation command as the PLC's 2-byte relay command.
+
+    Args:
+        command (WorkQCmnd_e):
+            One of the PLC_RELAY_COMMANDS, e.g. PLC_OPEN_PBV.
+        number (int):
+            The valve, solenoid or igniter number.
+
+    Returns:
+        bytes: The relay number followed by the relay state.
+    """
+    offset, state = PLC_RELAY_COMMANDS[command]
+    return int.to_bytes(number + offset, 1, "little") + int.to_bytes(state, 1, "little")
+
+def process_workq_message(message: WorkQCmnd, db_workq: mp.Queue, poller: Optional[PlcPoller] = None,
+                          state_rates: Dict[SystemStates, float] = STATE_PLC_POLL_RATE_HZ) -> bool:
     """
     Process the message from the workq.
 
@@ -136,48 +381,36 @@ def process_workq_message(message: WorkQCmnd, db_workq: mp.Queue) -> bool:
             The message from the workq.
         db_workq (mp.Queue):
             workq for the database.
+        poller (Optional[PlcPoller]):
+            The PLC poller, its rate follows the state. Without it data
+            requests are answered from this thread.
+        state_rates (Dict[SystemStates, float]):
+            The poll rate in Hz for each state.
     """
     if message.command == WorkQCmnd_e.KILL_PROCESS:
         print("PLC - Received kill command")
+        if poller is not None:
+            poller.stop()
         return False
+    elif message.command == WorkQCmnd_e.PLC_REQUEST_DATA and poller is not None:
+        poller.poll_now()
     elif message.command == WorkQCmnd_e.PLC_REQUEST_DATA:
         plc_command = int.to_bytes(PLC_REQUEST, 1, "little") + int.to_bytes(0, 1, "little")
         PlcHandler.send_command(plc_command)
         db_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_DATA, PlcHandler.read_response()))
         return True
 
-    elif message.command == WorkQCmnd_e.PLC_OPEN_PBV:
-        relay_num = message.data + PLC_PBV_OFFSET # Relay number to open the PBV 1 = 10, 2 = 11...
-        state = 1
-        plc_command = int.to_bytes(relay_num, 1, "little") + int.to_bytes(state, 1, "little")
-        PlcHandler.send_command(plc_command)
-    elif message.command == WorkQCmnd_e.PLC_CLOSE_PBV:
-        relay_num = message.data + PLC_PBV_OFFSET # Relay number to close the PBV 1 = 10, 2 = 11...
-        state = 0
-        plc_command = int.to_bytes(relay_num, 1, "little") + int.to_bytes(state, 1, "little")
-        PlcHandler.send_command(plc_command)
-    elif message.command == WorkQCmnd_e.PLC_OPEN_SOL:
-        sol_num = message.data + SOL_OFFSET # Solenoid 1 = case 21
-        state = 1
-        plc_command = int.to_bytes(sol_num, 1, "little") + int.to_bytes(state, 1, "little")
-        PlcHandler.send_command(plc_command)
-    elif message.command == WorkQCmnd_e.PLC_CLOSE_SOL:
-        sol_num = message.data + SOL_OFFSET
-        state = 0
-        plc_command = int.to_bytes(sol_num, 1, "little") + int.to_bytes(state, 1, "little")
-        PlcHandler.send_command(plc_command)
-    elif message.command == WorkQCmnd_e.PLC_IGN_ON:
-        ign_num = message.data + PLC_IGN_OFFSET
-        state = 1
-        plc_command = int.to_bytes(ign_num, 1, "little") + int.to_bytes(state, 1, "little")
-        PlcHandler.send_command(plc_command)
-    elif message.command == WorkQCmnd_e.PLC_IGN_OFF:
-        ign_num = message.data + PLC_IGN_OFFSET
-        state = 0
-        plc_command = int.to_bytes(ign_num, 1, "little") + int.to_bytes(state, 1, "little")
-        PlcHandler.send_command(plc_command)
+    elif message.command in PLC_RELAY_COMMANDS:
+        PlcHandler.send_command(encode_relay_command(message.command, message.data))
+    elif message.command == WorkQCmnd_e.PLC_RELAY_BATCH:
+        # Each relay is its own 2-byte write, like the single relay commands, sent back to back
+        # before the poller can interleave a data request
+        for command, number in message.data:
+            PlcHandler.send_command(encode_relay_command(command, number))
     elif message.command == WorkQCmnd_e.PLC_STATE_LIGHT_COMMAND:
         current_state = message.data
+        if poller is not None:
+            poller.set_rate(state_rates.get(current_state, PLC_POLL_RATE_HZ))
         if current_state == SystemStates.ABORT:
             plc_command = int.to_bytes(PLC_ABORT_LIGHT, 1, "little") + int.to_bytes(0, 1, "little")
         elif current_state == SystemStates.TEST:
@@ -197,34 +430,71 @@ def process_workq_message(message: WorkQCmnd, db_workq: mp.Queue) -> bool:
 
     return True
 
-def request_data_background(plc_workq: mp.Queue):
+def plc_thread(plc_workq: mp.Queue, db_workq: mp.Queue, state_rates: Dict[SystemStates, float] = STATE_PLC_POLL_RATE_HZ) -> None:
     """
-    Notify DB backend is Live
-    """
-    while True:
-        plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_REQUEST_DATA, None))
-        time.sleep(REQUEST_DELAY)
-
+    Poll the PLC for data and send it valve, igniter and light commands.
 
-def plc_thread(plc_workq: mp.Queue, db_workq: mp.Queue) -> None:
+    Args:
+        plc_workq (mp.Queue):
+            The work queue for the PLC commands.
+        db_workq (mp.Queue):
+            The work queue for the database, receives the PLC data.
+        state_rates (Dict[SystemStates, float]):
+            The poll rate in Hz for each state, PLC_POLL_RATE_HZ for the others.
+            Default is STATE_PLC_POLL_RATE_HZ.
+    """
     try:
         PlcHandler(plc_workq)
     except Exception as e:
         print(f"PLC - Error: {e}")
         return
 
-    # Start the background task in a separate thread
-    background_thread = threading.Thread(target=request_data_background, args=(plc_workq,))
-    background_thread.daemon = True
-    background_thread.start()
+    # Polling runs on its own threads, this loop only handles commands
+    poller = PlcPoller(db_workq)
+    latency = CommandLatency()
+
+    # Everything queued is sorted into two lanes, actuation and lights always go first
+    priority: deque = deque()
+    normal: deque = deque()
+    batch_sent = 0
+    batch_max_s = 0.0
 
     while 1:
-        # If there is any workq messages, process them
+        if not priority and not normal:
+            message = plc_workq.get(block=True)
+            (priority if message.command in PLC_PRIORITY_COMMANDS else normal).append(message)
+        while True:
+            try:
+                message = plc_workq.get_nowait()
+            except queue.Empty:
+                break
+            (priority if message.command in PLC_PRIORITY_COMMANDS else normal).append(message)
+
+        if priority:
+            poller.hold()
+            message = priority.popleft()
+        else:
+            message = normal.popleft()
+
+        generation = PlcHandler.generation
         try:
-            if not process_workq_message(plc_workq.get(block=True), db_workq):
+            if not process_workq_message(message, db_workq, poller, state_rates):
                 return
-        except TimeoutError as e:
-            print(f"PLC - Timeout error: {e}")
-            print("PLC - Retrying connection...")
-            PlcHandler(plc_workq)
+        except OSError as e:
+            print(f"PLC - Connection error: {e}")
+            PlcHandler.reconnect(generation)
+        else:
+            latency_s = time.monotonic() - message.enqueue_time
+            latency.record(message.command, latency_s)
+            if message.command in PLC_PRIORITY_COMMANDS:
+                batch_sent += 1
+                batch_max_s = max(batch_max_s, latency_s)
+
+        if not priority:
+            poller.release()
+            if batch_sent:
+                print(f"PLC - Sent {batch_sent} priority command(s), max enqueue-to-send {batch_max_s * 1000:.1f} ms")
+                batch_sent = 0
+                batch_max_s = 0.0
+        latency.report_if_due()
 
@@ -1,5 +1,5 @@
 import multiprocessing as mp
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from StateTruth import StateTruth, SystemStates
 from br_threading.WorkQCommands import WorkQCmnd, WorkQCmnd_e
@@ -40,6 +40,7 @@ class StateMachine():
         """
         if enabled is True and not self.hardware_abort:
             print("SM - Hardware abort set")
+            self.t7_pro_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_BURST_TRIGGER, "HARDWARE_ABORT"))
             self.attempt_transition("GOTO_ABORT")
 
         self.hardware_abort = enabled
@@ -75,26 +76,29 @@ class StateMachine():
     def set_valve_for_state(self, state: SystemStates) -> None:
         """
         Set the default state positions for the valves and pumps based on the current state.
+        The positions are sent as one relay batch, so they go out back to back with no polling in between.
         """
+        relays: List[Tuple[WorkQCmnd_e, int]] = []
+
         if state == SystemStates.ABORT:
             self.manual_override = False
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 1))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 2)) # CLOSED IS OPEN (DEENERGIZED OPEN)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 3))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 4)) # CLOSED IS OPEN (DEENERGIZED OPEN)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 5)) # CLOSED IS OPEN (DEENERGIZED OPEN)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 6))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 7))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 8))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 9)) # CLOSED IS OPEN (DEENERGIZED OPEN)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 10))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 11))
-
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_SOL, 1))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_SOL, 2))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_SOL, 3))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_SOL, 4))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_SOL, 5))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 1))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 2)) # CLOSED IS OPEN (DEENERGIZED OPEN)
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 3))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 4)) # CLOSED IS OPEN (DEENERGIZED OPEN)
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 5)) # CLOSED IS OPEN (DEENERGIZED OPEN)
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 6))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 7))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 8))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 9)) # CLOSED IS OPEN (DEENERGIZED OPEN)
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 10))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 11))
+
+            relays.append((WorkQCmnd_e.PLC_CLOSE_SOL, 1))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_SOL, 2))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_SOL, 3))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_SOL, 4))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_SOL, 5))
 
         if state == SystemStates.TEST:
             self.manual_override = True
@@ -104,48 +108,56 @@ class StateMachine():
 
         if state == SystemStates.IGNITION:
             self.manual_override = False
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 1))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 2)) # ENERGIZED IS CLOSED (OPEN COMMAND)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 3))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 4)) # ENERGIZED IS CLOSED (OPEN COMMAND)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 5)) # ENERGIZED IS CLOSED (OPEN COMMAND)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 6))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 7))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 8))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 9)) # ENERGIZED IS CLOSED (OPEN COMMAND)
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 10))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 11))
-
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_SOL, 1))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_SOL, 2))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_SOL, 3))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_SOL, 4))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_SOL, 5))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 1))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 2)) # ENERGIZED IS CLOSED (OPEN COMMAND)
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 3))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 4)) # ENERGIZED IS CLOSED (OPEN COMMAND)
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 5)) # ENERGIZED IS CLOSED (OPEN COMMAND)
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 6))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 7))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 8))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 9)) # ENERGIZED IS CLOSED (OPEN COMMAND)
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 10))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 11))
+
+            relays.append((WorkQCmnd_e.PLC_CLOSE_SOL, 1))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_SOL, 2))
+            relays.append((WorkQCmnd_e.PLC_OPEN_SOL, 3))
+            relays.append((WorkQCmnd_e.PLC_OPEN_SOL, 4))
+            relays.append((WorkQCmnd_e.PLC_OPEN_SOL, 5))
 
         if state == SystemStates.FIRE:
             self.manual_override = False
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 6))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 7))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 6))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 7))
 
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 10))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_OPEN_PBV, 11))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 10))
+            relays.append((WorkQCmnd_e.PLC_OPEN_PBV, 11))
 
         if state == SystemStates.POST_FIRE:
             self.manual_override = True
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 6))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 7))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 6))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 7))
 
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 10))
-            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_CLOSE_PBV, 11))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 10))
+            relays.append((WorkQCmnd_e.PLC_CLOSE_PBV, 11))
+
+        if relays:
+            self.plc_workq.put(WorkQCmnd(WorkQCmnd_e.PLC_RELAY_BATCH, relays))
 
     def update_labjack_logging(self, state: SystemStates) -> None:
         """
         Update the LabJack logging speed based on the current state.
+        The LabJack process picks the polling or stream rate for the state.
         """
+        if state == SystemStates.ABORT:
+            # Keep the high rate data leading up to the abort, the LabJack ignores it if already triggered
+            self.t7_pro_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_BURST_TRIGGER, "ABORT"))
+
         if state in (SystemStates.TEST, SystemStates.ABORT):
-            self.t7_pro_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_SLOW_LOGGING, None))
+            self.t7_pro_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_SLOW_LOGGING, state))
         else:
-            self.t7_pro_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_FAST_LOGGING, None))
+            self.t7_pro_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_FAST_LOGGING, state))
 
 
 
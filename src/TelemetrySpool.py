@@ -0,0 +1,285 @@
+# General imports =================================================================================
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from DatabaseWriter import DatabaseWriter
+
+# Constants ========================================================================================
+SPOOL_MAGIC = 0x314C4F4F50535242 # b"BRSPOOL1" little endian
+SPOOL_VERSION = 1
+SPOOL_HEADER_BYTES = 4096 # Header words followed by the column names as JSON
+SPOOL_VALUE_DTYPE = np.float64 # float32 halves the file size at the cost of precision
+
+SPOOL_UPLOAD_MAX_FRAMES = 5000 # Frames replayed in one create request at most
+SPOOL_RETRY_MIN_S = 0.5
+SPOOL_RETRY_MAX_S = 10.0
+
+# Header words (uint64)
+_HDR_MAGIC = 0
+_HDR_VERSION = 1
+_HDR_CAPACITY = 2
+_HDR_N_COLUMNS = 3
+_HDR_VALUE_SIZE = 4 # Bytes per value, 4 for float32 or 8 for float64
+_HDR_HEAD = 5 # Total frames ever written
+_HDR_TAIL = 6 # Total frames uploaded or overwritten
+_HDR_OVERWRITTEN = 7 # Total frames overwritten before they were uploaded
+_HDR_WORDS = 8
+
+# Class Definitions ===============================================================================
+class TelemetrySpool():
+    def __init__(self, path: str, columns: List[str], capacity: int, value_dtype=SPOOL_VALUE_DTYPE):
+        """
+        Memory mapped spool of fixed size telemetry frames on local storage.
+
+        Every frame holds a float64 timestamp and one value per column.
+        Frames are appended at the head and uploaded from the tail, both
+        counters live in the file header so frames that were never uploaded
+        survive a restart. The file is preallocated to capacity frames, if
+        the uploader falls that far behind the oldest unsent frames are
+        overwritten and counted.
+
+        An existing spool file with different columns is renamed aside
+        rather than reused, so its unsent frames are kept on disk.
+
+        Args:
+            path (str):
+                The spool file path.
+            columns (List[str]):
+                The value column names, in frame order.
+            capacity (int):
+                The number of frames the spool holds.
+            value_dtype (np.dtype):
+                The value type, np.float32 or np.float64.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.value_dtype = np.dtype(value_dtype).newbyteorder("<")
+        self.frame_dtype = np.dtype([("t", "<f8"), ("v", self.value_dtype, (len(self.columns),))])
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path) and not self._matches_file(capacity):
+            aside = f"{path}.{int(time.time())}"
+            print(f"SPOOL - Layout of {path} changed, keeping the old spool as {aside}")
+            os.rename(path, aside)
+
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate(SPOOL_HEADER_BYTES + capacity * self.frame_dtype.itemsize)
+            self._map()
+            self.header[:] = 0
+            self.header[_HDR_MAGIC] = SPOOL_MAGIC
+            self.header[_HDR_VERSION] = SPOOL_VERSION
+            self.header[_HDR_CAPACITY] = capacity
+            self.header[_HDR_N_COLUMNS] = len(self.columns)
+            self.header[_HDR_VALUE_SIZE] = self.value_dtype.itemsize
+            names = json.dumps(self.columns).encode()
+            self.buf[_HDR_WORDS * 8:_HDR_WORDS * 8 + len(names)] = np.frombuffer(names, dtype=np.uint8)
+            self.buf.flush()
+        else:
+            self._map()
+            if self.pending():
+                print(f"SPOOL - {path} has {self.pending()} frames from a previous run to upload")
+
+        self.capacity = int(self.header[_HDR_CAPACITY])
+
+    def _map(self) -> None:
+        self.buf = np.memmap(self.path, dtype=np.uint8, mode="r+")
+        self.header = self.buf[:_HDR_WORDS * 8].view("<u8")
+        self.frames = self.buf[SPOOL_HEADER_BYTES:].view(self.frame_dtype)
+
+    def _matches_file(self, capacity: int) -> bool:
+        """
+        Check whether the spool file on disk has the layout this spool expects.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read(SPOOL_HEADER_BYTES)
+            header = np.frombuffer(raw[:_HDR_WORDS * 8], dtype="<u8")
+            names = raw[_HDR_WORDS * 8:].rstrip(b"\0").decode()
+            return (
+                int(header[_HDR_MAGIC]) == SPOOL_MAGIC and
+                int(header[_HDR_VERSION]) == SPOOL_VERSION and
+                int(header[_HDR_CAPACITY]) == capacity and
+                int(header[_HDR_VALUE_SIZE]) == self.value_dtype.itemsize and
+                json.loads(names) == self.columns
+            )
+        except Exception:
+            return False
+
+    @property
+    def overwritten(self) -> int:
+        return int(self.header[_HDR_OVERWRITTEN])
+
+    def pending(self) -> int:
+        """
+        Returns:
+            int: The number of frames written but not yet uploaded.
+        """
+        return int(self.header[_HDR_HEAD] - self.header[_HDR_TAIL])
+
+    def append(self, record: Dict[str, np.ndarray]) -> None:
+        """
+        Append a record's samples as frames.
+
+        Args:
+            record (Dict[str, np.ndarray]):
+                Equal length columns, a "timestamp" column and one column per spool column.
+        """
+        timestamps = record["timestamp"]
+        n_frames = len(timestamps)
+        if n_frames == 0:
+            return
+
+        # Only the newest capacity frames of an oversized record can be kept
+        skip = max(0, n_frames - self.capacity)
+        block = np.empty(n_frames - skip, dtype=self.frame_dtype)
+        block["t"] = timestamps[skip:]
+        for i, name in enumerate(self.columns):
+            block["v"][:, i] = record[name][skip:]
+
+        with self.lock:
+            head = int(self.header[_HDR_HEAD]) + skip
+            start = head % self.capacity
+            first = min(len(block), self.capacity - start)
+            self.frames[start:start + first] = block[:first]
+            self.frames[:len(block) - first] = block[first:]
+
+            head += len(block)
+            self.header[_HDR_HEAD] = head
+            lost = head - int(self.header[_HDR_TAIL]) - self.capacity
+            if lost > 0:
+                self.header[_HDR_TAIL] += lost
+                self.header[_HDR_OVERWRITTEN] += lost
+
+    def read(self, max_frames: int) -> Optional[Tuple[int, int, Dict[str, list]]]:
+        """
+        Read the oldest frames that have not been uploaded.
+
+        Args:
+            max_frames (int): The most frames to read.
+
+        Returns:
+            Optional[Tuple[int, int, Dict[str, list]]]:
+                The index of the first frame, the frame count and the frames as
+                a database record, or None if every frame has been uploaded.
+        """
+        with self.lock:
+            tail = int(self.header[_HDR_TAIL])
+            count = min(max_frames, int(self.header[_HDR_HEAD]) - tail)
+            if count <= 0:
+                return None
+
+            start = tail % self.capacity
+            first = min(count, self.capacity - start)
+            block = np.concatenate((self.frames[start:start + first], self.frames[:count - first]))
+
+        record = {"timestamp": block["t"].tolist()}
+        for i, name in enumerate(self.columns):
+            record[name] = block["v"][:, i].tolist()
+        return tail, count, record
+
+    def commit(self, start: int, count: int) -> None:
+        """
+        Mark frames returned by read as uploaded.
+
+        Args:
+            start (int): The index of the first frame.
+            count (int): The frame count.
+        """
+        with self.lock:
+            # Frames overwritten while they were being uploaded already moved the tail
+            if int(self.header[_HDR_TAIL]) < start + count:
+                self.header[_HDR_TAIL] = start + count
+
+    def close(self) -> None:
+        self.buf.flush()
+        del self.header, self.frames, self.buf
+
+class SpoolUploader():
+    def __init__(self, spool: TelemetrySpool, writer: DatabaseWriter, collection: str, fields: Optional[Dict[str, Any]] = None):
+        """
+        Background thread uploading a spool's frames to a collection.
+        Frames are sent as soon as they are appended, if the database
+        is slow or down they stay in the spool and are replayed in bulk,
+        SPOOL_UPLOAD_MAX_FRAMES at a time, once it recovers. One request
+        is uploaded at a time, so the spool tail only ever moves past
+        frames that were created, in order.
+
+        Args:
+            spool (TelemetrySpool):
+                The spool to upload from.
+            writer (DatabaseWriter):
+                The writer used to create the records.
+            collection (str):
+                The name of the collection to create the records in.
+            fields (Optional[Dict[str, Any]]):
+                Fields added to every record, e.g. the name of the device the frames came from.
+        """
+        self.spool = spool
+        self.writer = writer
+        self.collection = collection
+        self.fields = dict(fields) if fields else {}
+        self.data_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._upload_loop, daemon=True)
+        self.thread.start()
+
+    def notify(self) -> None:
+        """
+        Wake the uploader after frames were appended.
+        """
+        self.data_event.set()
+
+    def stop(self) -> None:
+        """
+        Stop the uploader without waiting for it. The thread finishes its
+        in-flight request, if any, then closes the spool itself.
+        """
+        self.stop_event.set()
+        self.data_event.set()
+
+    def _upload_loop(self) -> None:
+        try:
+            self._upload_frames()
+        finally:
+            self.spool.close()
+
+    def _upload_frames(self) -> None:
+        retry_delay = SPOOL_RETRY_MIN_S
+        failing = False
+        overwritten = self.spool.overwritten
+
+        while not self.stop_event.is_set():
+            batch = self.spool.read(SPOOL_UPLOAD_MAX_FRAMES)
+            if batch is None:
+                self.data_event.wait(timeout=1.0)
+                self.data_event.clear()
+                continue
+
+            start, count, record = batch
+            record.update(self.fields)
+            try:
+                self.writer.submit(self.collection, record).result()
+            except Exception:
+                if not failing:
+                    print(f"SPOOL - {self.collection} upload failing, keeping frames locally")
+                    failing = True
+                self.stop_event.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, SPOOL_RETRY_MAX_S)
+                continue
+
+            self.spool.commit(start, count)
+            retry_delay = SPOOL_RETRY_MIN_S
+            if failing:
+                print(f"SPOOL - {self.collection} upload recovered, {self.spool.pending()} frames left to replay")
+                failing = False
+
+            if self.spool.overwritten != overwritten:
+                print(f"SPOOL - {self.collection} spool full, {self.spool.overwritten - overwritten} frames overwritten before upload")
+                overwritten = self.spool.overwritten
@@ -7,21 +7,26 @@ Classes:
 - LabJack: Wrapper for the LabJack device,
     for initialization, and any device wide functions (e.g. stream start/stop)
 - AnalogInput: Wrapper for analog input channels,
-    for setting the range, resolution, and reading the value for AIN channels
+    for setting the range, resolution, and reading the value for AIN channels,
+    and for building the configuration registers of a channel in one batch
 - AnalogOutput: Wrapper for analog output channels,
     for writing a voltage to the DAC channels
 - DigitalInput: Wrapper for digital input channels,
     for reading the value on DIO channels (includes FIO/EIO/CIO/MIO)
 - DigitalOutput: Wrapper for digital output channels,
     for writing a value to DIO channels (includes FIO/EIO/CIO/MIO)
+- DigitalPort: All DIO lines of a device with a local mirror of their states,
+    for writing several output lines in a single transaction
+- RegisterBatch: A fixed list of registers resolved to addresses once,
+    for reading them all in a single command/response transaction
 
 @author: Christopher Chan (cjchanx)
 @date: 2023-10-12
 @version: 0.1
 """""""""""""""""""""""""""""""""""""""""""""
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from labjack.ljm import ljm
-import sys, time
+import math, sys, time
 
 # Constants for configuration
 DEFAULT_STREAM_RESOLUTION = 1
@@ -29,6 +34,20 @@ DEFAULT_STREAM_RESOLUTION = 1
 # Constants from LabJack Data Sheets
 MAX_SAMPLES_PER_PACKET_USB = 24
 MAX_SAMPLES_PER_PACKET_ETH = 512
+CORE_TIMER_HZ = 40000000 # CORE_TIMER runs at half the 80 MHz core clock on the T7
+AIN_RANGES = [10, 1, 0.1, 0.01] # T7 analog input ranges in +/- volts
+AIN_SINGLE_ENDED = 199 # _NEGATIVE_CH value for single-ended (GND referenced) inputs
+DIO_LINE_OFFSETS = {"FIO": 0, "EIO": 8, "CIO": 16, "MIO": 20} # Bit of line 0 of each DIO group in DIO_STATE
+DIO_ALL_MASK = 0x7FFFFF # The 23 DIO lines of the T7
+STREAM_TRIGGER_EDGES = {"RISING": 3, "FALLING": 4, "BOTH": 5} # DIO_EF_INDEX that arms a stream trigger on each edge
+STREAM_TRIGGER_LINES = 8 # Only DIO0 to DIO7 (FIO0 to FIO7) can trigger a stream
+STREAM_CLOCK_INTERNAL = 0
+STREAM_CLOCK_EXTERNAL = 2 # External scan clock on CIO3
+# Highest total stream sample rate (scan rate x channels) at each STREAM_RESOLUTION_INDEX, +/-10 V range,
+# index 0 is the device default, which is index 1 on the T7
+STREAM_MAX_SAMPLE_RATE = {
+    "T7": {0: 100000, 1: 100000, 2: 48000, 3: 22000, 4: 11000, 5: 5500, 6: 2500, 7: 1200, 8: 600},
+}
 
 class LabJack:
     def __init__(self, device, connection, identifier = "ANY"):
@@ -43,6 +62,9 @@ class LabJack:
 
         self. dacMaxVolts = 10 # Note: Modify to 5V for T4/7
 
+        # Last value written to each configuration register, see write_names_cached
+        self.register_cache = {}
+
         if self.is_streaming():
             self.stop_stream()
 
@@ -50,7 +72,8 @@ class LabJack:
         ljm.close(self.handle)
         self.handle = 0
 
-    def start_stream(self, scan_list, scan_rate, scans_per_read = None, callback = None, obj = None, stream_resolution_index : int = DEFAULT_STREAM_RESOLUTION, settling_us : float = 0):
+    def start_stream(self, scan_list, scan_rate, scans_per_read = None, callback = None, obj = None, stream_resolution_index : int = DEFAULT_STREAM_RESOLUTION, settling_us : float = 0, buffer_size_bytes : int = 0,
+                     trigger_line : Optional[str] = None, trigger_edge : str = "RISING", clock_divisor : int = 0):
         """
         Start a stream with the given parameters.
         @assumptions ADC range and resolution have been configured.
@@ -63,8 +86,15 @@ class LabJack:
             https://support.labjack.com/docs/a-3-2-2-t7-noise-and-resolution-t-series-datasheet
             https://support.labjack.com/docs/a-3-3-2-t8-noise-and-resolution-t-series-datasheet
         @param settling_us: Settling time in microseconds, recommended to keep to 0 (automatic selection)
+        @param buffer_size_bytes: Device stream buffer size in bytes, a power of 2 up to 32768 on the T7, 0 for the default
+        @param trigger_line: DIO line whose edge takes the first scan, FIO0 to FIO7, None to start at once.
+            STREAM_START_TIME_STAMP is only valid once the first data arrives.
+        @param trigger_edge: "RISING", "FALLING" or "BOTH"
+        @param clock_divisor: Scan on every clock_divisor-th edge of an external clock on CIO3, 0 for the internal clock.
+            scan_rate must then be the expected external rate divided by clock_divisor
 
-        @return: Actual scan rate, 0 on error
+        @return: Actual scan rate, 0 on invalid input
+        @raise: The LJM error if the stream could not be configured or started
 
         @reference https://github.com/labjack/labjack-ljm-python/blob/master/Examples/More/Stream/stream_callback.py
         """
@@ -72,6 +102,9 @@ class LabJack:
         if scan_list is None or len(scan_list) == 0 or scan_rate <= 0:
             print("\033[91mInvalid input. Please enter valid scan list and scan rate.\033[0m")
             return 0
+        if trigger_line is not None and not LabJack.valid_stream_trigger(trigger_line, trigger_edge):
+            print(f"\033[91mInvalid stream trigger {trigger_edge} {trigger_line}, the line must be FIO0 to FIO7.\033[0m")
+            return 0
 
         try:
             # --- Input Processing ---
@@ -86,14 +119,40 @@ class LabJack:
             scan_list = ljm.namesToAddresses(len(scan_list), scan_list)[0]
 
             # --- Configuration ---
-            # Ensure triggered stream is disabled.
-            ljm.eWriteName(self.handle, "STREAM_TRIGGER_INDEX", 0)
-            # Enabling internally-clocked stream.
-            ljm.eWriteName(self.handle, "STREAM_CLOCK_SOURCE", 0)
-            # Set resolution index.
-            ljm.eWriteName(self.handle, "STREAM_RESOLUTION_INDEX", stream_resolution_index)
-            # Set settling time.
-            ljm.eWriteName(self.handle, "STREAM_SETTLING_US", settling_us)
+            trigger_index = 0
+            if trigger_line is not None:
+                trigger_dio = DigitalPort.line_bit(trigger_line)
+                ef_name = f"DIO{trigger_dio}_EF"
+                # The trigger is the address of the DIO channel (2000 + n) whose extended feature is armed
+                trigger_index = ljm.nameToAddress(f"DIO{trigger_dio}")[0]
+                # The extended feature is disabled before its index changes, then armed
+                ljm.eWriteNames(
+                    self.handle, 3,
+                    [ef_name + "_ENABLE", ef_name + "_INDEX", ef_name + "_ENABLE"],
+                    [0, STREAM_TRIGGER_EDGES[trigger_edge], 1]
+                )
+
+            # Triggered and externally clocked streams can wait indefinitely for data
+            if trigger_line is not None or clock_divisor > 0:
+                ljm.writeLibraryConfigS(ljm.constants.STREAM_RECEIVE_TIMEOUT_MODE, ljm.constants.STREAM_RECEIVE_TIMEOUT_MODE_MANUAL)
+                ljm.writeLibraryConfigS(ljm.constants.STREAM_RECEIVE_TIMEOUT_MS, 0)
+            else:
+                ljm.writeLibraryConfigS(ljm.constants.STREAM_RECEIVE_TIMEOUT_MODE, ljm.constants.STREAM_RECEIVE_TIMEOUT_MODE_CALCULATE)
+
+            # Only registers that differ from the last stream start are written
+            self.write_names_cached({
+                # Trigger index of the armed DIO_EF, 0 to start at once.
+                "STREAM_TRIGGER_INDEX": trigger_index,
+                # Internal or external scan clock.
+                "STREAM_CLOCK_SOURCE": STREAM_CLOCK_EXTERNAL if clock_divisor > 0 else STREAM_CLOCK_INTERNAL,
+                "STREAM_EXTERNAL_CLOCK_DIVISOR": max(1, clock_divisor),
+                # Set resolution index.
+                "STREAM_RESOLUTION_INDEX": stream_resolution_index,
+                # Set settling time.
+                "STREAM_SETTLING_US": settling_us,
+                # Set the device buffer, larger absorbs more network delay.
+                "STREAM_BUFFER_SIZE_BYTES": buffer_size_bytes,
+            })
 
             # --- Stream Start ---
             act_scan_rate = ljm.eStreamStart(self.handle, scans_per_read, len(scan_list), scan_list, scan_rate)
@@ -104,15 +163,48 @@ class LabJack:
                 callback_wrapper = lambda args: callback(obj, args)
                 ljm.setStreamCallback(self.handle, callback_wrapper)
 
-        except:
+        except ljm.LJMError:
             print("\033[91mError starting stream. Please check the LabJack connection and configuration.\033[0m")
             print(sys.exc_info()[1])
-            exit(1)
+            raise
+        except Exception:
+            print("\033[91mError starting stream. Please check the stream configuration.\033[0m")
+            print(sys.exc_info()[1])
+            return 0
         return act_scan_rate
 
+    @staticmethod
+    def valid_stream_trigger(trigger_line : str, trigger_edge : str) -> bool:
+        """
+        Check a stream trigger before arming it.
+        @param trigger_line: DIO channel name, e.g. "FIO0"
+        @param trigger_edge: "RISING", "FALLING" or "BOTH"
+        @return: True if the line can trigger a stream on that edge
+        """
+        try:
+            trigger_dio = DigitalPort.line_bit(trigger_line)
+        except ValueError:
+            return False
+        return trigger_dio < STREAM_TRIGGER_LINES and trigger_edge in STREAM_TRIGGER_EDGES
+
     def read_stream_start_time(self):
         return ljm.eReadName(self.handle, "STREAM_START_TIME_STAMP")
 
+    def get_stream_start_host_time(self) -> float:
+        """
+        Get the host time of the running stream's first scan.
+        STREAM_START_TIME_STAMP and CORE_TIMER are read in one transaction,
+        the ticks between them are subtracted from the host time at the read.
+
+        @return: Host time of the first scan in seconds since the epoch
+        """
+        before = time.time()
+        start_stamp, core_now = ljm.eReadNames(self.handle, 2, ["STREAM_START_TIME_STAMP", "CORE_TIMER"])
+        after = time.time()
+
+        elapsed_ticks = (int(core_now) - int(start_stamp)) & 0xFFFFFFFF # 32-bit counter
+        return (before + after) / 2 - elapsed_ticks / CORE_TIMER_HZ
+
     def read_stream(self):
         return ljm.eStreamRead(self.handle)
 
@@ -175,6 +267,64 @@ class LabJack:
         """
         return ljm.eReadNames(self.handle, len(name_list), name_list)
 
+    def write_names_cached(self, values: dict) -> int:
+        """
+        Write configuration registers in one call, skipping those already
+        holding the value. Only for registers nothing else changes on the device.
+        @param values: Register name to value, e.g. {"STREAM_SETTLING_US": 0}
+        @return: Number of registers written
+        """
+        changed = {name: value for name, value in values.items() if not _register_matches(self.register_cache.get(name), value)}
+        if changed:
+            ljm.eWriteNames(self.handle, len(changed), list(changed.keys()), list(changed.values()))
+            self.register_cache.update(changed)
+        return len(changed)
+
+    def read_names_cached(self, name_list: List[str]) -> None:
+        """
+        Read configuration registers missing from the cache in one call and
+        store them, so write_names_cached only writes values the device differs from.
+        @param name_list: List of register names, e.g. ["AIN0_RANGE"]
+        """
+        missing = [name for name in name_list if name not in self.register_cache]
+        if missing:
+            self.register_cache.update(zip(missing, ljm.eReadNames(self.handle, len(missing), missing)))
+
+    def apply_config(self, values: dict) -> int:
+        """
+        Bring configuration registers to the given values, reading back the
+        ones not cached yet and writing only those that differ, in one call each.
+        On a freshly opened device that was already configured nothing is written.
+        @param values: Register name to value, e.g. {"AIN0_RANGE": 10}
+        @return: Number of registers written
+        """
+        self.read_names_cached(list(values.keys()))
+        return self.write_names_cached(values)
+
+    def resolve_names(self, name_list: List[str]) -> Tuple[List[int], List[int]]:
+        """
+        Resolve register names to Modbus addresses and data types, without device I/O.
+        @param name_list: List of register names, e.g. ["AIN0", "AIN1"]
+        @return: (addresses, data types)
+        """
+        return ljm.namesToAddresses(len(name_list), name_list)
+
+    def read_addresses(self, addresses: List[int], data_types: List[int]) -> List[float]:
+        """
+        Read multiple registers by address in one call, skips the name lookup of read_names.
+        @param addresses: Modbus addresses from resolve_names
+        @param data_types: Data types from resolve_names
+        @return: List of float values
+        """
+        return ljm.eReadAddresses(self.handle, len(addresses), addresses, data_types)
+
+def _register_matches(cached: Optional[float], value: float) -> bool:
+    """
+    Compare a cached register value with a new one, tolerating the float32
+    rounding of values read back from the device (e.g. 0.1 V ranges).
+    """
+    return cached is not None and math.isclose(cached, value, rel_tol=1e-6, abs_tol=1e-9)
+
 class AnalogInput:
     def __init__(self, lj, channel_name, resolution_index):
         """
@@ -199,8 +349,8 @@ class AnalogInput:
         Set the voltage range for the analog input channel.
         @param voltage_range: Voltage range, either 10, 1, 0.1, or 0.01 for T7-Pro
         """
-        if voltage_range in [10, 1, 0.1, 0.01]:
-            ljm.eWriteName(self.lj.handle, self.channel_name + "_RANGE", voltage_range)
+        if voltage_range in AIN_RANGES:
+            self.lj.write_names_cached({self.channel_name + "_RANGE": voltage_range})
         else:
             print("Invalid voltage range. Please enter one of the following: 10, 1, 0.1, 0.01")
 
@@ -211,7 +361,7 @@ class AnalogInput:
         """
         if resolution_index in range(1, 13):
             self.resolution_index = resolution_index
-            ljm.eWriteName(self.lj.handle, self.channel_name + "_RESOLUTION_INDEX", self.resolution_index)
+            self.lj.write_names_cached({self.channel_name + "_RESOLUTION_INDEX": self.resolution_index})
         else:
             print("Invalid resolution index. Please enter a number between 1 and 12.")
 
@@ -222,12 +372,59 @@ class AnalogInput:
         @param negative_channel: The negative channel for differential mode
         """
         if mode == "DIFF":
-            ljm.eWriteName(self.lj.handle, self.channel_name + "_NEGATIVE_CH", negative_channel)
+            self.lj.write_names_cached({self.channel_name + "_NEGATIVE_CH": negative_channel})
         elif mode == "SE":
-            ljm.eWriteName(self.lj.handle, self.channel_name + "_NEGATIVE_CH", 199)
+            self.lj.write_names_cached({self.channel_name + "_NEGATIVE_CH": AIN_SINGLE_ENDED})
         else:
             print("Invalid mode. Please enter either 'SE' or 'DIFF'.")
 
+    def configure(self, voltage_range = None, resolution_index = None, mode = None, negative_channel = AIN_SINGLE_ENDED):
+        """
+        Set any of the range, resolution and mode in a single write.
+        Settings left as None are not changed.
+        @return: Number of registers written
+        """
+        if resolution_index is not None:
+            self.resolution_index = resolution_index
+        return self.lj.apply_config(AnalogInput.config_registers(
+            self.channel_name, voltage_range, resolution_index, mode, negative_channel
+        ))
+
+    @staticmethod
+    def config_registers(channel_name : str, voltage_range : Optional[float] = None, resolution_index : Optional[int] = None,
+                         mode : Optional[str] = None, negative_channel : int = AIN_SINGLE_ENDED) -> Dict[str, float]:
+        """
+        Build the configuration registers of an analog input channel, without device I/O.
+        The per-channel resolution index only applies to command/response reads,
+        streams use STREAM_RESOLUTION_INDEX.
+        @param channel_name: AIN channel name, e.g. "AIN0"
+        @param voltage_range: Voltage range, one of AIN_RANGES, None to leave unchanged
+        @param resolution_index: Resolution index, 0 (default) to 12 for T7-Pro, None to leave unchanged
+        @param mode: "SE" for single-ended, "DIFF" for differential, None to leave unchanged
+        @param negative_channel: The negative channel for differential mode
+        @return: Register name to value
+        @raise ValueError: If the channel or a setting is invalid
+        """
+        if not channel_name.startswith("AIN"):
+            raise ValueError(f"Invalid channel name {channel_name}")
+
+        registers = {}
+        if voltage_range is not None:
+            if voltage_range not in AIN_RANGES:
+                raise ValueError(f"Invalid voltage range {voltage_range} for {channel_name}, expected one of {AIN_RANGES}")
+            registers[channel_name + "_RANGE"] = voltage_range
+        if resolution_index is not None:
+            if resolution_index not in range(0, 13):
+                raise ValueError(f"Invalid resolution index {resolution_index} for {channel_name}, expected 0 to 12")
+            registers[channel_name + "_RESOLUTION_INDEX"] = resolution_index
+        if mode == "DIFF":
+            registers[channel_name + "_NEGATIVE_CH"] = negative_channel
+        elif mode == "SE":
+            registers[channel_name + "_NEGATIVE_CH"] = AIN_SINGLE_ENDED
+        elif mode is not None:
+            raise ValueError(f"Invalid mode {mode} for {channel_name}, expected 'SE' or 'DIFF'")
+        return registers
+
     def read(self):
         return ljm.eReadName(self.lj.handle, self.channel_name)
 
@@ -337,3 +534,113 @@ class DigitalOutput:
         """
         value = ljm.eReadName(self.lj.handle, self.channel_name)
         ljm.eWriteName(self.lj.handle, self.channel_name, 1 - value)
+
+class RegisterBatch:
+    def __init__(self, lj : LabJack, name_list : List[str]):
+        """
+        A fixed list of registers read together in a single transaction.
+        The names are resolved to addresses once here instead of on every read.
+        @param lj : LabJack object
+        @param name_list : List of register names, e.g. ["AIN0", "AIN1"]
+        """
+        self.lj = lj
+        self.names = list(name_list)
+        self.addresses, self.data_types = lj.resolve_names(self.names)
+
+    def read(self) -> List[float]:
+        """
+        Read every register in the batch.
+        @return: List of values in the order of the names
+        """
+        return self.lj.read_addresses(self.addresses, self.data_types)
+
+class DigitalPort:
+    def __init__(self, lj : LabJack):
+        """
+        All DIO lines of the LabJack, written through the DIO_STATE register.
+        A mirror of the line states and directions is read once here and then
+        kept locally, so toggles need no read and any set of lines is driven
+        in one transaction, with DIO_INHIBIT masking the lines not written
+        and cleared again at the end of it.
+        Create a new port after the device is reopened.
+        @param lj : LabJack object
+        """
+        self.lj = lj
+        self.state_mirror = 0
+        self.direction_mirror = 0
+        self.sync()
+
+    @staticmethod
+    def line_bit(channel_name : str) -> int:
+        """
+        Get the DIO_STATE bit of a line.
+        @param channel_name : DIO channel name, (includes FIO/EIO/CIO/MIO), e.g. "FIO0", or "DIO0"
+        @return: Bit index, e.g. 8 for "EIO0"
+        """
+        prefix = channel_name[0:3]
+        if prefix == "DIO":
+            bit = int(channel_name[3:])
+        elif prefix in DIO_LINE_OFFSETS:
+            bit = DIO_LINE_OFFSETS[prefix] + int(channel_name[3:])
+        else:
+            raise ValueError(f"Invalid channel name {channel_name}")
+        if bit < 0 or (1 << bit) & DIO_ALL_MASK == 0:
+            raise ValueError(f"Invalid channel name {channel_name}")
+        return bit
+
+    def sync(self):
+        """
+        Read the states and directions of all lines into the mirror, in one call.
+        Reading DIO_STATE does not change any line direction.
+        """
+        state, direction = ljm.eReadNames(self.lj.handle, 2, ["DIO_STATE", "DIO_DIRECTION"])
+        self.state_mirror = int(state)
+        self.direction_mirror = int(direction)
+
+    def write(self, values : Dict[str, bool]):
+        """
+        Drive several lines as outputs in a single transaction,
+        the lines not given are left untouched.
+        @param values: DIO channel name to value, e.g. {"FIO0": True, "FIO1": False}
+        """
+        mask = 0
+        state = self.state_mirror
+        for channel_name, value in values.items():
+            bit = 1 << DigitalPort.line_bit(channel_name)
+            mask |= bit
+            state = (state | bit) if value else (state & ~bit)
+        if mask == 0:
+            return
+
+        direction = self.direction_mirror | mask
+        # DIO_INHIBIT is cleared after the state, so other writers find no lines inhibited
+        ljm.eWriteNames(
+            self.lj.handle, 4,
+            ["DIO_INHIBIT", "DIO_DIRECTION", "DIO_STATE", "DIO_INHIBIT"],
+            [DIO_ALL_MASK & ~mask, direction, state, 0]
+        )
+        self.state_mirror = state
+        self.direction_mirror = direction
+
+    def set(self, channel_name : str, value : bool):
+        """
+        Drive a single line as an output.
+        @param value: False = low, True = high
+        """
+        self.write({channel_name: value})
+
+    def toggle(self, channel_name : str) -> bool:
+        """
+        Toggle an output line from its mirrored state, without reading the device.
+        @return: The new state
+        """
+        value = not self.get_state(channel_name)
+        self.write({channel_name: value})
+        return value
+
+    def get_state(self, channel_name : str) -> bool:
+        """
+        Get the mirrored state of a line, as last read by sync or written.
+        @return: False = low, True = high
+        """
+        return bool(self.state_mirror >> DigitalPort.line_bit(channel_name) & 1)
@@ -0,0 +1,205 @@
+# FILE: SharedFrameRing.py
+# BRIEF: This file contains a single-producer/single-consumer ring buffer
+#        of fixed size float64 frames held in shared memory, used to move
+#        bulk sensor data between processes without pickling it through a queue.
+
+# General imports =================================================================================
+import sys
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Constants ========================================================================================
+# Header words (int64)
+_HDR_WRITE_SEQ = 0 # Sequence number of the next frame to be written (producer owned)
+_HDR_READ_SEQ = 1 # Sequence number of the next frame to be read (consumer owned)
+_HDR_DROPPED = 2 # Number of frames dropped because the ring was full (producer owned)
+_HDR_CAPACITY = 3 # Number of frame slots
+_HDR_FRAME_LEN = 4 # Number of float64 values per frame
+_HDR_META_LEN = 5 # Number of int64 user tags stored alongside each frame
+_HDR_WORDS = 8
+
+# Class Definitions ===============================================================================
+class SharedFrameRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        """
+        Ring buffer of float64 frames in a shared memory block.
+        Use SharedFrameRing.create in the producer process and
+        SharedFrameRing.attach in the consumer process.
+
+        Each slot holds the frame sequence number, meta_len user tags
+        and frame_len float64 values. The producer never overwrites unread
+        frames, if the ring is full the new frame is dropped and counted.
+
+        Args:
+            shm (shared_memory.SharedMemory):
+                The shared memory block backing the ring.
+            owner (bool):
+                True if this side created the block and is responsible for unlinking it.
+        """
+        self.shm = shm
+        self.owner = owner
+
+        self.header = np.ndarray((_HDR_WORDS,), dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(self.header[_HDR_CAPACITY])
+        self.frame_len = int(self.header[_HDR_FRAME_LEN])
+        self.meta_len = int(self.header[_HDR_META_LEN])
+
+        meta_offset = _HDR_WORDS * 8
+        frame_offset = meta_offset + self.capacity * (1 + self.meta_len) * 8
+
+        self.meta = np.ndarray(
+            (self.capacity, 1 + self.meta_len), dtype=np.int64,
+            buffer=shm.buf, offset=meta_offset
+        )
+        self.frames = np.ndarray(
+            (self.capacity, self.frame_len), dtype=np.float64,
+            buffer=shm.buf, offset=frame_offset
+        )
+
+    @staticmethod
+    def create(name: str, capacity: int, frame_len: int, meta_len: int = 0) -> "SharedFrameRing":
+        """
+        Create a new ring in shared memory, called by the producer.
+
+        Args:
+            name (str):
+                The system wide name of the shared memory block.
+            capacity (int):
+                The number of frames the ring can hold.
+            frame_len (int):
+                The number of float64 values in each frame.
+            meta_len (int):
+                The number of int64 user tags stored with each frame.
+
+        Returns:
+            SharedFrameRing: The ring, owned by the caller.
+        """
+        if capacity <= 0 or frame_len <= 0 or meta_len < 0:
+            raise ValueError("Invalid ring dimensions")
+
+        size = _HDR_WORDS * 8 + capacity * (1 + meta_len) * 8 + capacity * frame_len * 8
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((_HDR_WORDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_HDR_CAPACITY] = capacity
+        header[_HDR_FRAME_LEN] = frame_len
+        header[_HDR_META_LEN] = meta_len
+        del header
+
+        return SharedFrameRing(shm, owner=True)
+
+    @staticmethod
+    def attach(name: str) -> "SharedFrameRing":
+        """
+        Attach to an existing ring, called by the consumer.
+
+        Args:
+            name (str): The system wide name of the shared memory block.
+
+        Returns:
+            SharedFrameRing: The ring, not owned by the caller.
+        """
+        shm = shared_memory.SharedMemory(name=name, create=False)
+
+        # Before python 3.13 attaching also registers the block with this
+        # process's resource tracker, which would unlink it when we exit.
+        if sys.version_info < (3, 13):
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory") # type: ignore
+            except Exception:
+                pass
+
+        return SharedFrameRing(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def dropped(self) -> int:
+        return int(self.header[_HDR_DROPPED])
+
+    def pending(self) -> int:
+        """
+        Returns:
+            int: The number of frames written but not yet read.
+        """
+        return int(self.header[_HDR_WRITE_SEQ] - self.header[_HDR_READ_SEQ])
+
+    def write(self, frame, tags: Tuple[int, ...] = ()) -> int:
+        """
+        Write a frame into the next free slot, producer side only.
+
+        Args:
+            frame (array like):
+                The frame values, must contain exactly frame_len values.
+            tags (Tuple[int, ...]):
+                Up to meta_len integer tags to store with the frame.
+
+        Returns:
+            int: The sequence number of the frame, or -1 if the ring was full and the frame was dropped.
+        """
+        write_seq = int(self.header[_HDR_WRITE_SEQ])
+        if write_seq - int(self.header[_HDR_READ_SEQ]) >= self.capacity:
+            self.header[_HDR_DROPPED] += 1
+            return -1
+
+        slot = write_seq % self.capacity
+        self.frames[slot, :] = frame
+        self.meta[slot, 0] = write_seq
+        if tags:
+            self.meta[slot, 1:1 + len(tags)] = tags
+
+        # Publish the frame only once its contents are in place
+        self.header[_HDR_WRITE_SEQ] = write_seq + 1
+        return write_seq
+
+    def read(self) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Read the oldest unread frame, consumer side only.
+
+        Returns:
+            Optional[Tuple[int, np.ndarray, np.ndarray]]:
+                The sequence number, a copy of the user tags and a copy of the frame,
+                or None if there is nothing to read.
+        """
+        read_seq = int(self.header[_HDR_READ_SEQ])
+        if read_seq == int(self.header[_HDR_WRITE_SEQ]):
+            return None
+
+        slot = read_seq % self.capacity
+        frame = self.frames[slot].copy()
+        tags = self.meta[slot, 1:].copy()
+        seq = int(self.meta[slot, 0])
+
+        # Release the slot back to the producer
+        self.header[_HDR_READ_SEQ] = read_seq + 1
+        return seq, tags, frame
+
+    def read_all(self) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Read every frame currently available, consumer side only.
+
+        Returns:
+            List[Tuple[int, np.ndarray, np.ndarray]]: The frames as returned by read, oldest first.
+        """
+        frames = []
+        while (entry := self.read()) is not None:
+            frames.append(entry)
+        return frames
+
+    def close(self) -> None:
+        """
+        Detach from the ring, and unlink the shared memory block if this side created it.
+        """
+        # Drop the numpy views first, the block cannot close while they exist
+        del self.header, self.meta, self.frames
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
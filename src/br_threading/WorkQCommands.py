@@ -1,4 +1,5 @@
 from enum import Enum, auto
+import time
 from typing import Any
 
 
@@ -14,8 +15,13 @@ class WorkQCmnd_e(Enum):
 
     ## Labjack Data from LJ to the DB
     LJ_DATA = auto() # Log LabJack data to DB, expects dictionary [str: float]
-    LJ_SLOW_LOGGING = auto() # Start slow logging on the LabJack, expects a scan rate in Hz
-    LJ_FAST_LOGGING = auto() # Start fast logging on the
+    LJ_RING_ATTACH = auto() # A LabJack shared memory ring was created, expects a LjRingInfo object
+    LJ_RING_ATTACHED = auto() # The database attached a LabJack shared memory ring, expects the ring name
+    LJ_RING_DATA = auto() # New frames are available in a LabJack shared memory ring, expects the ring name
+    DB_LJ_STREAM_STATS = auto() # Log LabJack stream counters to DB, expects a dictionary record
+    LJ_SLOW_LOGGING = auto() # Start slow logging on the LabJack, expects the SystemStates to pick the polling rate for (or None)
+    LJ_FAST_LOGGING = auto() # Start fast logging on the LabJack, expects the SystemStates to pick the stream rate for (or None)
+    LJ_BURST_TRIGGER = auto() # Write the stream data around now to a local burst file, expects the reason as a string
 
     ## PLC Internal Commands
     PLC_REQUEST_DATA = auto() # Request data from the PLC (Internal PLC Command)
@@ -33,6 +39,8 @@ class WorkQCmnd_e(Enum):
     PLC_IGN_ON = auto() # Turn on the igniter, expects the igniter number
     PLC_IGN_OFF = auto() # Turn off the igniter, expects the igniter number
 
+    PLC_RELAY_BATCH = auto() # Send several of the commands above back to back, expects a list of (WorkQCmnd_e, number)
+
     PLC_STATE_LIGHT_COMMAND = auto() # Command to change the state of the light, expects SystemStates object
 
     ## State Machine Commands
@@ -40,7 +48,7 @@ class WorkQCmnd_e(Enum):
     STATE_TRANSITION = auto() # Attempt to transition to a new state
 
     ## Load Cell Commands
-    LC_REFERENCE_VOLTAGE = auto() # Set the reference voltage for the load cell calibration, expects a float
+    LC_REFERENCE_VOLTAGE = auto() # Set the reference voltage for the load cell calibration, expects an LjReferenceVoltage
 
     ## Hardware Abort
     RPI_HARDWARE_ABORT = auto()
@@ -48,8 +56,10 @@ class WorkQCmnd_e(Enum):
 
     ## PLC RESET
     LJ_FIO0_TOGGLE = auto()
+    LJ_DIO_PULSE = auto() # Invert a LabJack digital output for a while, expects a LjDioPulse object
 
 class WorkQCmnd:
     def __init__(self, command: WorkQCmnd_e, data: Any):
         self.command = command
-        self.data = data
\ No newline at end of file
+        self.data = data
+        self.enqueue_time = time.monotonic() # System-wide clock, comparable across processes
\ No newline at end of file
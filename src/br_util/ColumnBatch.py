@@ -0,0 +1,120 @@
+# FILE: ColumnBatch.py
+# BRIEF: This file contains a columnar sample accumulator used to batch
+#        telemetry into database records without per-sample list operations.
+
+# General imports =================================================================================
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Class Definitions ===============================================================================
+class ColumnBatch:
+    def __init__(self, max_samples: int, max_period_s: float):
+        """
+        Accumulates named columns of samples into preallocated arrays
+        with a shared write cursor. A batch is complete once it holds
+        max_samples samples, or max_period_s seconds after its first sample
+        arrived, whichever comes first.
+
+        The set of columns is taken from the first chunk appended to an
+        empty batch, every following chunk must contain the same columns.
+
+        Args:
+            max_samples (int):
+                The number of samples per column that completes a batch.
+            max_period_s (float):
+                The age in seconds of the oldest sample that completes a batch.
+        """
+        self.max_samples = max(1, int(max_samples))
+        self.max_period_s = max_period_s
+        self.columns: Dict[str, np.ndarray] = {}
+        self.cursor = 0
+        self.first_sample_time = 0.0
+
+    def __len__(self) -> int:
+        return self.cursor
+
+    def matches(self, chunk: Dict[str, np.ndarray]) -> bool:
+        """
+        Args:
+            chunk (Dict[str, np.ndarray]): A chunk of columns.
+
+        Returns:
+            bool: True if the chunk can be appended to the current batch.
+        """
+        return self.cursor == 0 or chunk.keys() == self.columns.keys()
+
+    def extend(self, chunk: Dict[str, np.ndarray]) -> List[Dict[str, np.ndarray]]:
+        """
+        Append a chunk of equal length columns, completing as many
+        batches as the chunk fills. If the chunk's columns differ from
+        the batch in progress, that batch is completed first.
+
+        Args:
+            chunk (Dict[str, np.ndarray]):
+                The columns to append, keyed by column name.
+
+        Returns:
+            List[Dict[str, np.ndarray]]: The records for every batch completed by this chunk.
+        """
+        records = []
+        if not chunk:
+            return records
+
+        if not self.matches(chunk):
+            records.append(self.flush())
+
+        n_samples = len(next(iter(chunk.values())))
+        offset = 0
+        while offset < n_samples:
+            if self.cursor == 0:
+                self._start_batch(chunk)
+
+            count = min(self.max_samples - self.cursor, n_samples - offset)
+            for name, column in self.columns.items():
+                column[self.cursor:self.cursor + count] = chunk[name][offset:offset + count]
+            self.cursor += count
+            offset += count
+
+            if self.cursor >= self.max_samples:
+                records.append(self.flush())
+
+        return records
+
+    def flush_if_due(self, now: Optional[float] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Complete the batch in progress if its time window has elapsed.
+
+        Args:
+            now (Optional[float]): The current time.monotonic() value, read if not given.
+
+        Returns:
+            Optional[Dict[str, np.ndarray]]: The completed record, or None if the batch is not due.
+        """
+        if self.cursor == 0:
+            return None
+        if now is None:
+            now = time.monotonic()
+        if now - self.first_sample_time < self.max_period_s:
+            return None
+        return self.flush()
+
+    def flush(self) -> Dict[str, np.ndarray]:
+        """
+        Complete the batch in progress and reset the cursor.
+
+        Returns:
+            Dict[str, np.ndarray]: The record holding a copy of each column's samples.
+        """
+        record = {name: column[:self.cursor].copy() for name, column in self.columns.items()}
+        self.cursor = 0
+        return record
+
+    def _start_batch(self, chunk: Dict[str, np.ndarray]) -> None:
+        """
+        Start a new batch, (re)allocating the columns if the chunk's columns changed.
+        """
+        if chunk.keys() != self.columns.keys():
+            self.columns = {name: np.empty(self.max_samples, dtype=np.float64) for name in chunk}
+        self.first_sample_time = time.monotonic()
@@ -0,0 +1,84 @@
+# FILE: PeriodicDeadline.py
+# BRIEF: This file contains a drift-free periodic deadline on the monotonic
+#        clock, used to schedule polling loops that also service work queues.
+
+# General imports =================================================================================
+import time
+from typing import Optional
+
+# Class Definitions ===============================================================================
+class PeriodicDeadline:
+    def __init__(self, period_s: float, start: Optional[float] = None):
+        """
+        A deadline that advances by a fixed period on the monotonic clock.
+
+        The next deadline is always computed from the previous one rather
+        than from when the work finished, so the rate does not drift with
+        the time the work takes. If the loop falls more than a period
+        behind, the missed deadlines are skipped instead of run back to back.
+
+        Args:
+            period_s (float):
+                The period in seconds.
+            start (Optional[float]):
+                The time.monotonic() value of the first deadline, now if not given.
+        """
+        self.period_s = period_s
+        self.deadline = time.monotonic() if start is None else start
+        self.missed = 0
+
+    def time_until(self, now: Optional[float] = None) -> float:
+        """
+        Args:
+            now (Optional[float]): The current time.monotonic() value, read if not given.
+
+        Returns:
+            float: The seconds until the deadline, 0 if it has passed.
+        """
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self.deadline - now)
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """
+        Check whether the deadline has passed and if so advance it by one period.
+
+        Args:
+            now (Optional[float]): The current time.monotonic() value, read if not given.
+
+        Returns:
+            bool: True if the deadline had passed.
+        """
+        if now is None:
+            now = time.monotonic()
+        if now < self.deadline:
+            return False
+
+        self.deadline += self.period_s
+        if self.deadline <= now:
+            skipped = int((now - self.deadline) // self.period_s) + 1
+            self.missed += skipped
+            self.deadline += skipped * self.period_s
+        return True
+
+    def set_period(self, period_s: float, now: Optional[float] = None) -> None:
+        """
+        Change the period, the next deadline is one new period after the current time at most.
+
+        Args:
+            period_s (float): The new period in seconds.
+            now (Optional[float]): The current time.monotonic() value, read if not given.
+        """
+        if now is None:
+            now = time.monotonic()
+        self.period_s = period_s
+        self.deadline = min(self.deadline, now + period_s)
+
+    def reset(self, now: Optional[float] = None) -> None:
+        """
+        Make the deadline due immediately.
+
+        Args:
+            now (Optional[float]): The current time.monotonic() value, read if not given.
+        """
+        self.deadline = time.monotonic() if now is None else now
@@ -0,0 +1,93 @@
+# FILE: TimerQueue.py
+# BRIEF: This file contains a one-shot timer queue on the monotonic clock,
+#        run from a polling loop instead of a thread or process per timer.
+
+# General imports =================================================================================
+import heapq
+import itertools
+import time
+from typing import Callable, List, Optional, Tuple
+
+# Class Definitions ===============================================================================
+class TimerQueue:
+    def __init__(self):
+        """
+        One-shot timers kept in a heap ordered by deadline.
+
+        The owning loop blocks for at most time_until() and then calls
+        run_due(), so the callbacks run on the loop's own thread and no
+        locking is needed. Cancelled timers stay in the heap and are
+        skipped when they come due.
+        """
+        self.heap: List[Tuple[float, int, Callable[[], None]]] = []
+        self.counter = itertools.count()
+        self.cancelled = set()
+
+    def schedule(self, delay_s: float, callback: Callable[[], None], now: Optional[float] = None) -> int:
+        """
+        Schedule a callback.
+
+        Args:
+            delay_s (float):
+                The seconds from now until the callback runs.
+            callback (Callable[[], None]):
+                The function to call.
+            now (Optional[float]):
+                The current time.monotonic() value, read if not given.
+
+        Returns:
+            int: The timer id, for cancel.
+        """
+        if now is None:
+            now = time.monotonic()
+        timer_id = next(self.counter)
+        heapq.heappush(self.heap, (now + delay_s, timer_id, callback))
+        return timer_id
+
+    def cancel(self, timer_id: int) -> None:
+        """
+        Cancel a timer that has not run yet.
+
+        Args:
+            timer_id (int): The timer id from schedule.
+        """
+        if any(entry[1] == timer_id for entry in self.heap):
+            self.cancelled.add(timer_id)
+
+    def time_until(self, now: Optional[float] = None) -> float:
+        """
+        Args:
+            now (Optional[float]): The current time.monotonic() value, read if not given.
+
+        Returns:
+            float: The seconds until the next timer is due, 0 if it has passed
+                and infinity if there are no timers.
+        """
+        if not self.heap:
+            return float("inf")
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self.heap[0][0] - now)
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """
+        Run the callbacks of every timer that is due, in deadline order.
+
+        Args:
+            now (Optional[float]): The current time.monotonic() value, read if not given.
+
+        Returns:
+            int: The number of callbacks run.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        run = 0
+        while self.heap and self.heap[0][0] <= now:
+            _, timer_id, callback = heapq.heappop(self.heap)
+            if timer_id in self.cancelled:
+                self.cancelled.discard(timer_id)
+                continue
+            callback()
+            run += 1
+        return run
@@ -14,6 +14,7 @@ PLC_FILE_PATH = os.path.join(Path(__file__).parent, "data_files", PLC_FILE_NAME)
 
 LJ_FILE_NAME = "lj_data.csv"
 LJ_FILE_PATH = os.path.join(Path(__file__).parent, "data_files", LJ_FILE_NAME)
+LJ_COLUMNS = ["LC3", "LC4", "LC5", "LC6", "PT6", "PT7", "PT8", "PT9", "PT10", "PT11", "PT12", "PT13", "PT14"]
 
 SET_ALLOWED_READ_LIMIT = False  # Limit for the number of records to read from the database
 ALLOWED_READ_LIMIT = 50000
@@ -58,6 +59,15 @@ def get_all_records(client, collection_name):
     return all_records
 
 
+def lj_file_path_for(device: str) -> str:
+    """
+    The CSV file for a LabJack's records, LJ_FILE_PATH for records without a device.
+    """
+    if not device:
+        return LJ_FILE_PATH
+    return os.path.join(Path(__file__).parent, "data_files", f"lj_data_{device}.csv")
+
+
 # MAIN ++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 # Connect
@@ -94,7 +104,7 @@ print(f"{len(plc_all_records)} records found in <Plc>")
 print("DB - READING LJ DATA")
 
 lj_all_records = get_all_records(client, 'LabJack')
-print(f"{len(lj_all_records)} records found in <Plc>")
+print(f"{len(lj_all_records)} records found in <LabJack>")
 
 print(f"DB - WRITE PLC DATA TO {PLC_FILE_PATH}")
 
@@ -163,6 +173,14 @@ with open(PLC_FILE_PATH, 'w') as f:
                 f"{ign1},{ign2}\n"
             )
 
+        # Newer records carry a timestamp per sample, no need to spread them over the second
+        timestamps = getattr(set_of_records, "timestamp", None)
+        if timestamps:
+            for entry_time, entry in zip(timestamps, current_entries):
+                f.write(f"{datetime.datetime.fromtimestamp(entry_time, datetime.timezone.utc)}," + entry)
+            current_entries.clear()
+            continue
+
         if current_time != previous_time:
 
             num_entries = len(all_current_time_entries)
@@ -182,61 +200,71 @@ with open(PLC_FILE_PATH, 'w') as f:
 print("DB - Data stored in file:", PLC_FILE_PATH)
 
 
-print(f"DB - WRITE LJ DATA TO {LJ_FILE_PATH}")
+# One file per LabJack, each with the columns its records carry
+lj_records_by_device = {}
+for set_of_records in lj_all_records:
+    device = getattr(set_of_records, "device", None) or ""
+    lj_records_by_device.setdefault(device, []).append(set_of_records)
 
-os.makedirs(os.path.dirname(LJ_FILE_PATH), exist_ok=True)
+for device, device_records in lj_records_by_device.items():
+    lj_file_path = lj_file_path_for(device)
+    columns = [
+        column for column in LJ_COLUMNS
+        if any(getattr(set_of_records, column.lower(), None) for set_of_records in device_records)
+    ]
+    # Channels of other LabJacks, any list field that is not the timestamp
+    columns += sorted({
+        name.upper() for set_of_records in device_records for name, value in vars(set_of_records).items()
+        if isinstance(value, list) and name != "timestamp" and name.upper() not in LJ_COLUMNS
+    })
 
-with open(LJ_FILE_PATH, 'w') as f:
-    f.write("time,LC3,LC4,LC5,LC6,PT6,PT7,PT8,PT9,PT10,PT11,PT12,PT13,PT14\n")
+    print(f"DB - WRITE LJ DATA FROM {device or 'LabJack'} TO {lj_file_path}")
 
+    os.makedirs(os.path.dirname(lj_file_path), exist_ok=True)
 
-    previous_time = None
-    current_time = 0
-    all_current_time_entries = []
-    current_entries = []
-    total_time_count = -1
-    for set_of_records in lj_all_records:
+    with open(lj_file_path, 'w') as f:
+        f.write(",".join(["time"] + columns) + "\n")
 
-        current_time = set_of_records.created
+        previous_time = None
+        current_time = 0
+        all_current_time_entries = []
+        current_entries = []
+        for set_of_records in device_records:
 
-        if previous_time is None:
-            previous_time = current_time
+            current_time = set_of_records.created
 
-        for i in range(len(set_of_records.lc3)):
-            lc3 = set_of_records.lc3[i]
-            lc4 = set_of_records.lc4[i]
-            lc5 = set_of_records.lc5[i]
-            lc6 = set_of_records.lc6[i]
-            pt6 = set_of_records.pt6[i]
-            pt7 = set_of_records.pt7[i]
-            pt8 = set_of_records.pt8[i]
-            pt9 = set_of_records.pt9[i]
-            pt10 = set_of_records.pt10[i]
-            pt11 = set_of_records.pt11[i]
-            pt12 = set_of_records.pt12[i]
-            pt13 = set_of_records.pt13[i]
-            pt14 = set_of_records.pt14[i]
+            if previous_time is None:
+                previous_time = current_time
 
-            current_entries.append(
-                f"{lc3},{lc4},{lc5},{lc6},"
-                f"{pt6},{pt7},{pt8},{pt9},{pt10},{pt11},{pt12},{pt13},{pt14}\n"
-            )
+            values = [getattr(set_of_records, column.lower(), None) or [] for column in columns]
+            n_samples = max((len(column_values) for column_values in values), default=0)
+            for i in range(n_samples):
+                current_entries.append(
+                    ",".join(str(column_values[i]) if i < len(column_values) else "" for column_values in values) + "\n"
+                )
 
-        if current_time != previous_time:
+            # Newer records carry the stream timestamp of every sample
+            timestamps = getattr(set_of_records, "timestamp", None)
+            if timestamps:
+                for entry_time, entry in zip(timestamps, current_entries):
+                    f.write(f"{datetime.datetime.fromtimestamp(entry_time, datetime.timezone.utc)}," + entry)
+                current_entries.clear()
+                continue
 
-            num_entries = len(all_current_time_entries)
-            time_step = 1000 / num_entries
-            entry_time = previous_time
+            if current_time != previous_time:
 
-            for entry in all_current_time_entries:
-                f.write(f"{entry_time}," + entry)
-                entry_time += datetime.timedelta(milliseconds=time_step)
+                num_entries = len(all_current_time_entries)
+                time_step = 1000 / num_entries
+                entry_time = previous_time
 
-            all_current_time_entries.clear()
+                for entry in all_current_time_entries:
+                    f.write(f"{entry_time}," + entry)
+                    entry_time += datetime.timedelta(milliseconds=time_step)
 
-        all_current_time_entries.extend(current_entries)
-        current_entries.clear()
-        previous_time = current_time
+                all_current_time_entries.clear()
 
-print("DB - Data stored in file:", LJ_FILE_PATH)
+            all_current_time_entries.extend(current_entries)
+            current_entries.clear()
+            previous_time = current_time
 
+    print("DB - Data stored in file:", lj_file_path)
@@ -0,0 +1,103 @@
+"""
+Stand-in for the PLC, for running the PLC process without the hardware.
+
+It speaks the PLC's TCP protocol: 2-byte commands (number, state), where a
+data request (1) is answered with a 52-byte frame of TCs, LCs, PTs and
+valve states, relays 10 to 27 set the valves, solenoids and igniters, 28 to
+33 select a state light, and anything else is answered with "Unknown command".
+Every command received in one read is applied together, like one PLC scan,
+and each scan that switched relays is printed.
+
+Point PLC_IP and PLC_PORT in src/PlcHandler.py at the host and port it listens on.
+"""
+import argparse
+import math
+from pathlib import Path
+import socket
+import sys
+import time
+import os.path as path
+
+sys.path.append(path.join(Path(__file__).parents[2].as_posix(), "src/"))
+
+from PlcHandler import (
+    PLC_FRAME, PLC_REQUEST, PLC_PBV_OFFSET, PLC_TC_COUNT, PLC_LC_COUNT, PLC_PT_COUNT,
+    PLC_VALVE_COUNT, PLC_ABORT_LIGHT, PLC_POST_FIRE_LIGHT, PLC_UNKNOWN_COMMAND, PT_COEFFICIENT
+)
+
+FIRST_RELAY = PLC_PBV_OFFSET + 1 # PBV 1, the valve states are relays FIRST_RELAY onwards
+
+
+def build_frame(relays: list, start_time: float) -> bytes:
+    """
+    Build a response frame with slowly varying sensor values and the current relay states.
+    """
+    t = time.monotonic() - start_time
+    tcs = [int(2000 + 100 * i + 50 * math.sin(t)) for i in range(PLC_TC_COUNT)] # 0.01 C
+    lcs = [int(100 * math.sin(t + i)) for i in range(PLC_LC_COUNT)]
+    pts = [int(PT_COEFFICIENT * (1 + 0.1 * i + 0.05 * math.sin(t))) for i in range(PLC_PT_COUNT)]
+    return PLC_FRAME.pack(*tcs, *lcs, *pts, *relays)
+
+
+def serve_client(conn: socket.socket, start_time: float) -> None:
+    relays = [0] * PLC_VALVE_COUNT
+    pending = b""
+    scan = 0
+
+    while True:
+        data = conn.recv(4096)
+        if not data:
+            return
+        pending += data
+        n_commands = len(pending) // 2
+        commands, pending = pending[:2 * n_commands], pending[2 * n_commands:]
+
+        scan += 1
+        switched = []
+        replies = []
+        for i in range(0, len(commands), 2):
+            number, state = commands[i], commands[i + 1]
+            if number == PLC_REQUEST:
+                replies.append(build_frame(relays, start_time))
+            elif FIRST_RELAY <= number < FIRST_RELAY + PLC_VALVE_COUNT:
+                relays[number - FIRST_RELAY] = state
+                switched.append(f"{number}={state}")
+            elif PLC_ABORT_LIGHT <= number <= PLC_POST_FIRE_LIGHT:
+                print(f"Scan {scan}: state light {number}")
+            else:
+                replies.append(PLC_UNKNOWN_COMMAND)
+
+        if switched:
+            print(f"Scan {scan}: {len(switched)} relay(s) switched: {' '.join(switched)}")
+        if replies:
+            conn.sendall(b"".join(replies))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in PLC server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6969)
+    args = parser.parse_args()
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((args.host, args.port))
+    server.listen(1)
+    print(f"Stand-in PLC listening on {args.host}:{args.port}")
+
+    start_time = time.monotonic()
+    while True:
+        conn, address = server.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        print(f"Client connected from {address[0]}:{address[1]}")
+        try:
+            serve_client(conn, start_time)
+        except OSError as e:
+            print(f"Client error: {e}")
+        finally:
+            conn.close()
+            print("Client disconnected")
+
+
+if __name__ == "__main__":
+    main()
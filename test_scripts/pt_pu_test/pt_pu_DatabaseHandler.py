@@ -1,12 +1,16 @@
 import multiprocessing as mp
 from os import path
 from pathlib import Path
+import queue
 import sys
+import time
+
+import numpy as np
 
 sys.path.append(path.join(Path(__file__).parents[2].as_posix(), "src/"))
 
-from DatabaseHandler import DatabaseHandler
-from LabjackProcess import GET_SCANS_PER_READ, LjData
+from DatabaseHandler import BATCH_FLUSH_POLL_S, DatabaseHandler
+from LabjackProcess import LjData
 from br_threading.WorkQCommands import WorkQCmnd, WorkQCmnd_e
 
 PRESSURE_MODIFIER = lambda x: 571.77 * x - 362.5
@@ -20,48 +24,56 @@ class PtPu_DatabaseHandler(DatabaseHandler):
         Attempt to write incoming labjack data to the database.
 
         Batch Write Feature:
-        If there is a LJ_PACKET_SIZE specified, the DB handler will
-        collect that many pieces of data and write to the DB once the
-        full package is complete, this allows for faster DB writes.
+        Columns are accumulated in the DatabaseHandler batch and a record
+        is written once the batch is complete, this allows for faster DB writes.
 
         Args:
             lj_data (tuple): The labjack data, with the first position
                 containing the list of data
         """
+        chunk = {}
+        for key, values in lj_data.pt_data.items():
+            values = np.asarray(values, dtype=np.float64)
+            if key == "PT1":
+                chunk["raw_voltage_PT1"] = values
+                chunk[key] = PRESSURE_MODIFIER(values)
+            else:
+                chunk[key] = values * PU_VOLTAGE_MODIFIER
+
+        n_samples = len(next(iter(chunk.values())))
+        if lj_data.start_time is not None:
+            chunk["timestamp"] = lj_data.start_time + (lj_data.scan_index + np.arange(n_samples)) / lj_data.scan_rate
+        else:
+            chunk["timestamp"] = time.time() - np.arange(n_samples - 1, -1, -1) / lj_data.scan_rate
+
+        DatabaseHandler.batch_lj_chunk(lj_data.device, chunk)
 
-        for i in range(GET_SCANS_PER_READ(lj_data.scan_rate)):
-            for key in lj_data.pt_data:
-                if key == "PT1":
-                    pt1_raw = lj_data.pt_data[key].pop(0)
-                    DatabaseHandler.lj_data_packet["raw_voltage_PT1"].append(pt1_raw)
-                    DatabaseHandler.lj_data_packet[key].append(PRESSURE_MODIFIER(pt1_raw))
-                else:
-                    DatabaseHandler.lj_data_packet[key].append(lj_data.pt_data[key].pop(0) * PU_VOLTAGE_MODIFIER)
-            if len(DatabaseHandler.lj_data_packet[key]) == lj_data.scan_rate:
-                try:
-                    DatabaseHandler.client.collection("LabJack").create(DatabaseHandler.lj_data_packet)
-                except Exception as e:
-                    print(f"failed to create a lj_data entry {e}")
-                DatabaseHandler.lj_data_packet.clear()
-
-
-def process_workq_message(message: WorkQCmnd) -> bool:
+
+def process_workq_message(message: WorkQCmnd, lj_workq: mp.Queue) -> bool:
     """
     Process the message from the workq.
 
     Args:
         message (WorkQCmnd):
             The message from the workq.
+        lj_workq (mp.Queue):
+            The LabJack thread workq, told when a ring was attached.
     """
     if message.command == WorkQCmnd_e.KILL_PROCESS:
         print("DB - Received kill command")
         return False
     elif message.command == WorkQCmnd_e.LJ_DATA:
         PtPu_DatabaseHandler.write_lj_data(message.data)
+    elif message.command == WorkQCmnd_e.LJ_RING_ATTACH:
+        if PtPu_DatabaseHandler.attach_lj_ring(message.data):
+            lj_workq.put(WorkQCmnd(WorkQCmnd_e.LJ_RING_ATTACHED, message.data.ring_name))
+    elif message.command == WorkQCmnd_e.LJ_RING_DATA:
+        for lj_data in PtPu_DatabaseHandler.read_lj_ring(message.data):
+            PtPu_DatabaseHandler.write_lj_data(lj_data)
 
     return True
 
-def database_thread(db_workq: mp.Queue, data_base_format_file: str) -> None:
+def database_thread(db_workq: mp.Queue, lj_workq: mp.Queue, data_base_format_file: str) -> None:
     """
     The main loop of the database handler. It subscribes to the CommandMessage collection
     """
@@ -70,5 +82,11 @@ def database_thread(db_workq: mp.Queue, data_base_format_file: str) -> None:
 
     while 1:
         # If there is any workq messages, process them
-        if not process_workq_message(db_workq.get(block=True)):
+        try:
+            message = db_workq.get(block=True, timeout=BATCH_FLUSH_POLL_S)
+        except queue.Empty:
+            PtPu_DatabaseHandler.flush_due_batches()
+            continue
+
+        if not process_workq_message(message, lj_workq):
             return
@@ -1,10 +1,8 @@
-from collections import defaultdict
 import multiprocessing as mp
 from pathlib import Path
 import sys
 import time
 import os.path as path
-from typing import Any
 
 
 sys.path.append(path.join(Path(__file__).parents[2].as_posix(), "src/"))
@@ -12,49 +10,22 @@ sys.path.append(path.join(Path(__file__).parents[2].as_posix(), "src/"))
 from br_threading.WorkQCommands import WorkQCmnd, WorkQCmnd_e
 from pt_pu_DatabaseHandler import database_thread
 from br_threading.ThreadManager import ThreadManager as tm
-from LabjackProcess import GET_SCANS_PER_READ, _CallbackClass, LjData, t7_pro_thread
+from LabjackProcess import LjDeviceConfig, t7_pro_thread
 
 TEST_DATABASE_SCHEMA = path.join(Path(__file__).parent, "pt_pu_DatabaseSchema.json")
 PT_PU_LJ_FREQ = 500 # Hz
-
-def pt_pu_lj_callback(obj: _CallbackClass, stream_handle: Any):
-    """
-    SPECIFIC CALLBACK FUNCTION FOR PT PU TEST
-
-    The callback function for the LabJack T7 Pro,
-    for when the LabJack T7 Pro receives stream data.
-
-    Args:
-        obj (_CallbackClass): The callback class for the LabJack T7 Pro.
-        stream_handle (Any): The stream handle for the LabJack T7 Pro.
-    """
-    ff = obj.lji.read_stream()
-
-    scan_rate = obj.scan_rate
-    pt_data = defaultdict(list)
-
-    for i in range(GET_SCANS_PER_READ(scan_rate)):
-        data_arr = ff[0][i: i + 2] # for the 2 channels
-
-        pt_data["PT1"].append(data_arr[0]) # PT1 raw voltage
-        pt_data["PU1"].append(data_arr[1]) # PU1
-
-    cmnd = WorkQCmnd(WorkQCmnd_e.LJ_DATA, LjData(obj.scan_rate, {}, pt_data))
-
-    for workq in obj.subscribed_workq_list:
-        workq.put(cmnd)
-
+PT_PU_PT_MAP = {"AIN0": "PT1", "AIN1": "PU1"} # PT1 raw voltage, PU1
 
 if __name__ == "__main__":
     db_workq = mp.Queue()
     t7_pro_workq = mp.Queue()
     state_workq = mp.Queue() # need for db to not crash out in case of state request, but not used
 
-    labjack_scan_names = ["AIN0", "AIN1"]
+    labjack_devices = [LjDeviceConfig("PT_PU", scan_list=["AIN0", "AIN1"], pt_map=PT_PU_PT_MAP, lc_map={})]
 
     # Initialize the threads
-    tm.create_thread(target=database_thread, args=(db_workq, TEST_DATABASE_SCHEMA))
-    tm.create_thread(target=t7_pro_thread, args=(t7_pro_workq, db_workq, PT_PU_LJ_FREQ, labjack_scan_names, pt_pu_lj_callback))
+    tm.create_thread(target=database_thread, args=(db_workq, t7_pro_workq, TEST_DATABASE_SCHEMA))
+    tm.create_thread(target=t7_pro_thread, args=(t7_pro_workq, db_workq, labjack_devices, PT_PU_LJ_FREQ))
 
     tm.start_threads()
     while 1:
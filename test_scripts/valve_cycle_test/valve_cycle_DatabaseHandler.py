@@ -31,25 +31,27 @@ class ValveCycle_DatabaseHandler(DatabaseHandler):
         pt_data = plc_data.pt_data
         valve_data = plc_data.valve_data
 
-        DatabaseHandler.plc_data_packet["PT1"].append(pt_data[0]*580)
-        DatabaseHandler.plc_data_packet["PT2"].append(pt_data[1]*580)
-        DatabaseHandler.plc_data_packet["PT3"].append(pt_data[2]*145)
+        chunk = {}
+        chunk["timestamp"] = [plc_data.timestamp]
+        chunk["PT1"] = [pt_data[0]*580]
+        chunk["PT2"] = [pt_data[1]*580]
+        chunk["PT3"] = [pt_data[2]*145]
 
-        DatabaseHandler.plc_data_packet["PBV1"].append(valve_data[0])
-        DatabaseHandler.plc_data_packet["PBV2"].append(valve_data[1])
+        chunk["PBV1"] = [valve_data[0]]
+        chunk["PBV2"] = [valve_data[1]]
 
-        if len(DatabaseHandler.plc_data_packet["PT1"]) == int(1/plc_data.scan_rate):
-            print("PLC data:")
-            print("PT1:",DatabaseHandler.plc_data_packet["PT1"][int(1/plc_data.scan_rate-1)])
-            print("PT2:",DatabaseHandler.plc_data_packet["PT2"][int(1/plc_data.scan_rate-1)])
-            print("PT3:",DatabaseHandler.plc_data_packet["PT3"][int(1/plc_data.scan_rate-1)])
+        records = DatabaseHandler.plc_batch.extend(chunk)
+        record = DatabaseHandler.plc_batch.flush_if_due()
+        if record is not None:
+            records.append(record)
 
-            try:
-                DatabaseHandler.client.collection("Plc").create(DatabaseHandler.plc_data_packet)
-            except Exception as e:
-                print(f"failed to create a plc_data entry {e}")
+        for record in records:
+            print("PLC data:")
+            print("PT1:", record["PT1"][-1])
+            print("PT2:", record["PT2"][-1])
+            print("PT3:", record["PT3"][-1])
 
-            DatabaseHandler.plc_data_packet.clear()
+        DatabaseHandler.spool_records("Plc", records)
 
 def process_workq_message(message: WorkQCmnd , state_workq: mp.Queue) -> bool:
     """